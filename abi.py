@@ -1,8 +1,39 @@
 from sys import platform as running_platform
 
 
+# Runtime functions returning a C int. On x86_64 only the low half of %rax is
+# set, so the result is sign extended before it is used as a 64 bit value.
+INT_RESULT_CALLS = {
+    "input",
+    "_rand_zero_or_one",
+    "is_true",
+    "tag",
+    "is_int",
+    "is_bool",
+    "is_big",
+    "project_int",
+    "project_bool",
+    "equal",
+    "not_equal",
+    "has_attr",
+    "inherits",
+}
+
+# Hot runtime entry points with a regparm(3) variant, named with an "_rp"
+# suffix, taking their first args in `ABI.regparm_regs` on i386.
+REGPARM_CALLS = {
+    "print_int_nl",
+    "create_list_from",
+    "dict_from_pairs",
+    "get_subscript",
+    "set_subscript",
+    "list_get_int",
+    "list_set_int",
+}
+
+
 class ABI:
-    def __init__(self, platform=running_platform):
+    def __init__(self, platform=running_platform, arch="i386"):
 
         if platform == "linux" or platform == "linux2":
             self.platform = "linux"
@@ -20,6 +51,41 @@ class ABI:
         else:
             raise RuntimeError("Platform abi not implemented.", platform)
 
+        # Registers are named by their low 32 bits everywhere in the compiler,
+        # x86_64 code is widened when it is emitted (see `instructions.widen`).
+        if arch == "i386":
+            self.arch = "i386"
+            self.word_size = 4
+            # cdecl, everything is passed on the stack
+            self.arg_regs = []
+            self.caller_save_regs = {"%eax", "%edx"}
+            self.callee_save_regs = {"%edi", "%esi"}
+            # callee saved registers main uses, and has to restore
+            self.saved_regs = []
+            # gcc's regparm(3), for `REGPARM_CALLS`
+            self.regparm_regs = ["%eax", "%edx", "%ecx"]
+
+        elif arch == "x86_64":
+            self.arch = "x86_64"
+            self.word_size = 8
+            # The System V AMD64 ABI wants a 16 byte aligned stack at calls on
+            # every platform, and passes the first 6 args in registers.
+            self.required_offset = 16
+            self.arg_regs = ["%edi", "%esi", "%edx", "%ecx", "%r8d", "%r9d"]
+            self.caller_save_regs = {"%eax", "%edx", "%edi", "%esi",
+                                     "%r8d", "%r9d", "%r10d", "%r11d"}
+            self.callee_save_regs = {"%r12d", "%r13d", "%r14d", "%r15d"}
+            self.saved_regs = ["%ebx", "%r12d", "%r13d", "%r14d", "%r15d"]
+            # args are in registers already
+            self.regparm_regs = []
+
+        else:
+            raise RuntimeError("Architecture not implemented.", arch)
+
+        self.regs = self.caller_save_regs | self.callee_save_regs
+        # %ebx holds zigzag jump targets and %ecx is the scratch register
+        self.reserved_regs = {"%ebx", "%ecx", "%esp", "%ebp"}
+
     def label(self, label):
         # type: (str) -> str
         """
@@ -28,6 +94,32 @@ class ABI:
         """
         return self.symbol_prefix + label
 
+    def call_regs(self, func):
+        # type: (str) -> [str]
+        """
+        Registers the first args of a call to func are passed in, in order.
+        """
+        if self.regparm_regs and func in REGPARM_CALLS:
+            return self.regparm_regs
+        return self.arg_regs
+
+    def call_label(self, func):
+        # type: (str) -> str
+        """
+        The label a call to func jumps to, the regparm variant if there is one.
+        """
+        if self.regparm_regs and func in REGPARM_CALLS:
+            func += "_rp"
+        return self.label(func)
+
+    def frame_bytes(self):
+        # type: () -> int
+        """
+        Bytes main pushes before its locals: the return address, the saved
+        registers and the old frame pointer.
+        """
+        return self.word_size * (2 + len(self.saved_regs))
+
     def padding_before_call(self, curr_offset, params_bytes):
         # type: (int, int) -> int
         # python throws exception on `x % 0`
@@ -41,5 +133,5 @@ class ABI:
 abi = ABI()
 
 
-def set_abi(platform):
-    abi.__init__(platform)
+def set_abi(platform=running_platform, arch="i386"):
+    abi.__init__(platform, arch)
@@ -24,6 +24,17 @@ def allocate():
         return InternalName("PYYC_TEMP_" + str(__temp_vars))
 
 
+def reset_temps():
+    # type: () -> ()
+    """
+    Starts numbering temps from 1 again, so each compilation names its temps
+    the same, whatever was compiled before it in the process.
+    """
+    global __temp_vars
+    __temp_vars = 0
+    del __freed[:]
+
+
 def free(name):
     # type: (Name) -> ()
     if isinstance(name, InternalName):
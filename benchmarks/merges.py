@@ -0,0 +1,22 @@
+_rand_seed_time()
+secret = _rand_zero_or_one()
+i = 1000000
+a = 0
+b = 1
+c = 2
+d = 3
+_nanotime_begin()
+while i:
+    if secret:
+        a = a + i
+        b = b + 3
+        c = c + 5
+        d = d + 7
+    else:
+        a = a + 1
+        b = b + i
+        c = c + 2
+        d = d + 4
+    i = i + -1
+_print_nanotime_diff()
+print a + b + c + d
@@ -0,0 +1,10 @@
+_rand_seed_time()
+secret = _rand_zero_or_one()
+i = 1000000
+s = 0
+_nanotime_begin()
+while i:
+    s = s + secret
+    i = i + -1
+_print_nanotime_diff()
+print s
@@ -4,16 +4,24 @@ from libs.termcolor import colored
 
 from compiler.ast import Module, Name, Const
 from flatten import flatten
-from explicate_ast import IfStmt, Eq, NEq, WhileStmt
-from desugar import desugar
-from abi import set_abi
+from explicate_ast import IfStmt, Eq, NEq, WhileStmt, GetTag, Box, UnBox, \
+    int_tag, bool_tag, big_tag, tag_mask, tag_shift
+from desugar import desugar, STACK_ARRAY_CALLS
+from abi import abi, set_abi
 from compiler import parse
 from instructions import *
 from interference import interference
-from rm_cf_name_collisions_pass import rm_cf_name_collisions
+from rm_cf_name_collisions_pass import rm_cf_name_collisions_all
 from if_to_cmov_pass import if_to_cmov
+from schedule_pass import schedule_merges
+from ssa_pass import to_ssa, definition_order
+from secret_taint_pass import mark_secret_branches
+from licm_pass import hoist_loop_invariants
+from liveness import annotate_liveness, max_live
+from unroll_pass import unroll_loops
+from subscript_pass import specialize_subscripts
 from graph import Uncolorable
-from allocator import allocate
+from allocator import reset_temps
 from benchmark import BenchMark
 from utils import flat_map
 
@@ -21,6 +29,14 @@ from utils import flat_map
 DEBUG = False
 BENCH = False
 CONSTANT_TIME = True
+# Merge constant time branches with and/or masks instead of cmov
+PREDICATED = False
+# Only protect branches that depend on secret inputs
+SECRET_ONLY = False
+# How many times constant time while loops are unrolled (1 disables it)
+UNROLL = 1
+# Build SSA for constant time code, and color registers in definition order
+SSA = False
 BENCH_BINARY = True
 
 
@@ -70,6 +86,7 @@ class _ProgramCompiler:
                 "Both input_code and input_filename are None! Specify one!")
 
         self.x86IR = []
+        reset_temps()
 
         _start_bm("parsing")
         self.ast = parse(input_code)
@@ -88,10 +105,10 @@ class _ProgramCompiler:
 
         # enumerate vars
         self.vars = dict()  # offset from %ebp for variable address on stack
-        # Starts at 4 instead of 0 since we are reserving -4(%ebp) as the pseudo
-        # memory location for constant time code.
-        self.bytes_used = 4
-        self.colors = list(regs)
+        # Starts at one word instead of 0 since we are reserving -4(%ebp) as the
+        # pseudo memory location for constant time code.
+        self.bytes_used = abi.word_size
+        self.colors = list(abi.regs)
 
     @staticmethod
     def _expr_to_x86IR(expr, target=None):
@@ -100,23 +117,50 @@ class _ProgramCompiler:
         Compiles expr into x86IR, which puts result of expression into target.
         The target is a variable name.
         '''
+        def same(a, b):
+            return isinstance(a, Name) and isinstance(b, Name) and a.name == b.name
+
         x86IR = []
         if isinstance(expr, compiler.ast.Add):
-            x86IR.append(addl(expr.left, expr.right))
-            if target is not None and target != expr.right:
-                x86IR.append(movl(expr.right, target))
+            left, right = expr.left, expr.right
+            if target is None:
+                # adds have no side effects
+                pass
+            elif isinstance(left, Const) and isinstance(right, Const):
+                x86IR.append(movl(Const(left.value + right.value), target))
+            elif isinstance(left, Const) and left.value == 0:
+                x86IR.append(movl(right, target))
+            elif isinstance(right, Const) and right.value == 0:
+                x86IR.append(movl(left, target))
+            elif same(left, right):
+                # x + x -> x << 1
+                if not same(left, target):
+                    x86IR.append(movl(left, target))
+                x86IR.append(sall(Const(1), target))
+            elif same(right, target):
+                x86IR.append(addl(left, target))
+            elif same(left, target):
+                x86IR.append(addl(right, target))
+            else:
+                x86IR.append(leal(left, right, target))
         elif isinstance(expr, compiler.ast.UnarySub):
-            if target is not None and expr.expr != target:
-                x86IR.append(movl(expr.expr, target))
+            if target is None:
+                pass
+            elif isinstance(expr.expr, Const):
+                x86IR.append(movl(Const(-expr.expr.value), target))
+            else:
+                if not same(expr.expr, target):
+                    x86IR.append(movl(expr.expr, target))
                 x86IR.append(negl(target))
+        elif isinstance(expr, compiler.ast.CallFunc) and \
+                expr.node.name in STACK_ARRAY_CALLS:
+            # f(n, *elems) -> f(n, pointer to elems laid out on the stack)
+            count, elems = expr.args[0], expr.args[1:]
+            x86IR += _ProgramCompiler._call_x86IR(expr.node.name, [count], elems)
+            if target is not None:
+                x86IR.append(movl("%eax", target))
         elif isinstance(expr, compiler.ast.CallFunc):
-            pad_instr = pad_args(len(expr.args) * 4)
-            x86IR.append(pad_instr)
-            for name in reversed(expr.args):
-                x86IR.append(pushl(name))
-            x86IR.append(call(expr.node.name))
-            x86IR.append(addl(Const(len(expr.args) * 4), "%esp"))
-            x86IR.append(unpad_args(pad_instr))
+            x86IR += _ProgramCompiler._call_x86IR(expr.node.name, expr.args)
             if target is not None and expr != target:
                 x86IR.append(movl("%eax", target))
             # TODO: handle args, star args, double star args
@@ -124,6 +168,43 @@ class _ProgramCompiler:
                                                                 compiler.ast.Name):
             if target is not None and expr != target:
                 x86IR.append(movl(expr, target))
+        elif isinstance(expr, GetTag):
+            # tagging is inlined, only big objects need the runtime
+            if target is None:
+                pass
+            elif isinstance(expr.arg, Const):
+                x86IR.append(movl(Const(expr.arg.value & tag_mask.value), target))
+            else:
+                if not same(expr.arg, target):
+                    x86IR.append(movl(expr.arg, target))
+                x86IR.append(andl(tag_mask, target))
+        elif isinstance(expr, Box):
+            tag = {"int": int_tag, "bool": bool_tag, "big": big_tag}[expr.type]
+            if target is None:
+                pass
+            elif isinstance(expr.arg, Const) and expr.type != "big":
+                boxed = (expr.arg.value << tag_shift.value) | tag.value
+                x86IR.append(movl(Const(boxed), target))
+            else:
+                if not same(expr.arg, target):
+                    x86IR.append(movl(expr.arg, target))
+                if expr.type != "big":
+                    # big objects are pointers, with the low bits free for the tag
+                    x86IR.append(sall(tag_shift, target))
+                if tag.value != 0:
+                    x86IR.append(orl(tag, target))
+        elif isinstance(expr, UnBox):
+            if target is None:
+                pass
+            elif isinstance(expr.arg, Const) and expr.type == "small":
+                x86IR.append(movl(Const(expr.arg.value >> tag_shift.value), target))
+            else:
+                if not same(expr.arg, target):
+                    x86IR.append(movl(expr.arg, target))
+                if expr.type == "small":
+                    x86IR.append(sarl(tag_shift, target))
+                else:
+                    x86IR.append(andl(Const(~tag_mask.value), target))
         elif isinstance(expr, Eq):
             x86IR.append(cmpl(expr.left, expr.right))
             x86IR.append(sete_cl())
@@ -138,6 +219,44 @@ class _ProgramCompiler:
             raise TypeError(expr)
         return x86IR
 
+    @staticmethod
+    def _call_x86IR(func, args, stack_elems=None):
+        # type: (str, [compiler.ast.Node], [compiler.ast.Node]) -> ([x86instruction])
+        '''
+        Calls func with args, passed as `abi` wants them. With stack_elems,
+        those are laid out on the stack first, and a pointer to the first one
+        is passed after args.
+        '''
+        x86IR = []
+        elems = stack_elems or []
+        if stack_elems is not None:
+            args = args + ["%esp"]
+        arg_regs = abi.call_regs(func)
+        reg_args = args[:len(arg_regs)]
+        stack_args = args[len(arg_regs):]
+        n_bytes = (len(elems) + len(stack_args)) * abi.word_size
+        pad_instr = pad_args(n_bytes)
+        x86IR.append(pad_instr)
+        for name in reversed(elems):
+            x86IR.append(pushl(name))
+        # "%esp" pushes (or moves) the value %esp had before, i.e. &elems[0]
+        for name in reversed(stack_args):
+            x86IR.append(pushl(name))
+        # last first, so each value dies as early as it can, and the one going
+        # to the last register can still be computed in the first
+        for name, reg in reversed(zip(reg_args, arg_regs)):
+            x86IR.append(movl(name, reg))
+        x86IR.append(call(func, len(reg_args)))
+        x86IR.append(addl(Const(n_bytes), "%esp"))
+        x86IR.append(unpad_args(pad_instr))
+        return x86IR
+
+    def _specialize_subscripts(self):
+        _start_bm("subscripts")
+        self.flat_ast = specialize_subscripts(self.flat_ast)
+        _end_bm("subscripts")
+        _dbg("Specialized AST:", self.flat_ast)
+
     def _get_x86IR(self):
         def __get_x86IR(nodes):
             # type: ([compiler.ast.Node]) -> ([x86instruction])
@@ -150,12 +269,7 @@ class _ProgramCompiler:
                         return NotImplemented(
                             "Cannot print zero nodes. TODO: print endl")
                     node = stmt.nodes[0]
-                    pad_instr = pad_args(4)
-                    x86IR.append(pad_instr)
-                    x86IR.append(pushl(node))
-                    x86IR.append(call("print_int_nl"))
-                    x86IR.append(addl(Const(4), "%esp"))
-                    x86IR.append(unpad_args(pad_instr))
+                    x86IR += self._call_x86IR("print_int_nl", [node])
                 elif isinstance(stmt, compiler.ast.Assign):
                     if len(stmt.nodes) > 1:
                         raise NotImplementedError(
@@ -187,13 +301,37 @@ class _ProgramCompiler:
             self.x86IR = self.x86IR
         return
 
+    def _mark_secret_branches(self):
+        if SECRET_ONLY:
+            _start_bm("taint")
+            mark_secret_branches(self.x86IR)
+            _end_bm("taint")
+
+    def _unroll_loops(self):
+        if CONSTANT_TIME and UNROLL > 1:
+            _start_bm("unrolling")
+            self.x86IR = unroll_loops(self.x86IR, UNROLL)
+            _end_bm("unrolling")
+
     def _if_to_cmov(self):
-        if CONSTANT_TIME:
-            uncollided = map(rm_cf_name_collisions, self.x86IR)
+        if CONSTANT_TIME and SSA:
+            _start_bm("ssa")
+            self.x86IR = to_ssa(self.x86IR, predicated=PREDICATED)
+            _end_bm("ssa")
+            _dbg("SSA IR: ", "\n".join(map(str, self.x86IR)))
+        elif CONSTANT_TIME:
+            uncollided = rm_cf_name_collisions_all(self.x86IR)
             _dbg("Uncollided IR: ", uncollided)
-            self.x86IR = flat_map(if_to_cmov, uncollided)
+            self.x86IR = flat_map(
+                lambda i: if_to_cmov(i, predicated=PREDICATED), uncollided)
             _dbg("Constant IR: ", "\n".join(map(str, self.x86IR)))
 
+    def _hoist_loop_invariants(self):
+        _start_bm("licm")
+        self.x86IR = hoist_loop_invariants(self.x86IR)
+        _end_bm("licm")
+        _dbg("Hoisted IR: ", "\n".join(map(str, self.x86IR)))
+
     def _get_x86IR_liveness(self):
         def __get_x86IR_liveness(x86IR, curr_live):
             for i in range(len(x86IR) - 1, -1, -1):
@@ -206,7 +344,7 @@ class _ProgramCompiler:
                     curr_live = live_then_ | live_else_
 
                 elif isinstance(x86IR[i], while_instr):
-                    live_test_var = {x86IR[i].vars[0].name}
+                    live_test_var = set(x86IR[i].vars_names())
 
                     live_test_instrs = __get_x86IR_liveness(x86IR[i].test_instrs, curr_live.copy())
                     live_body = __get_x86IR_liveness(x86IR[i].body, curr_live.copy())
@@ -240,23 +378,57 @@ class _ProgramCompiler:
             return curr_live
 
         _start_bm("liveness")
-        __get_x86IR_liveness(self.x86IR, set())
+        if CONSTANT_TIME and SSA:
+            # copies at the end of loop bodies only coalesce with exact liveness
+            annotate_liveness(self.x86IR, set())
+        else:
+            __get_x86IR_liveness(self.x86IR, set())
         _end_bm("liveness")
 
     def _build_interference_graph(self):
+        def add_move_hints(x86IR):
+            for instr in x86IR:
+                if isinstance(instr, if_instr):
+                    add_move_hints(instr.then_)
+                    add_move_hints(instr.else_)
+                elif isinstance(instr, while_instr):
+                    add_move_hints(instr.test_instrs)
+                    add_move_hints(instr.body)
+                elif isinstance(instr, movl):
+                    names = instr.vars_names()
+                    if len(names) == 2:
+                        self.interference_graph.add_hint(*names)
+
         _start_bm("interference")
         self.interference_graph = interference(self.x86IR)
+        if CONSTANT_TIME and SSA:
+            # SSA adds a copy per phi and updated name, which are free if
+            # both ends get the same color
+            add_move_hints(self.x86IR)
         _end_bm("interference")
 
     def _allocate_regs(self):
         def generate_color():
-            self.bytes_used += 4
+            self.bytes_used += abi.word_size
             new_color = "-" + str(self.bytes_used) + "(%ebp)"
             self.colors.append(new_color)
             return new_color
 
         _start_bm("coloring")
-        self.interference_graph.color(self.colors, generate_color)
+        if CONSTANT_TIME and SSA and max_live(self.x86IR) <= len(abi.regs):
+            # values that have to be in a register go first
+            graph = self.interference_graph
+            order = [name for name, node in graph.nodes.items() if node.priority == 1]
+            order += definition_order(self.x86IR) + graph.nodes.keys()
+            try:
+                graph.color_in_order(order, self.colors)
+            except Uncolorable:
+                # registers taken by calls and merges leave too few, and
+                # coloring in order doesn't choose well what to spill
+                graph.clear_colors()
+                graph.color(self.colors, generate_color)
+        else:
+            self.interference_graph.color(self.colors, generate_color)
         self.vars = {name: node.color for name, node in
                      self.interference_graph.nodes.items()}
         for instr in self.x86IR:
@@ -271,12 +443,15 @@ class _ProgramCompiler:
             while i < len_x86IR:
                 instr = x86IR[i]
                 if isinstance(instr, if_instr):
-                    if spill(instr.then_) or spill(instr.else_):
+                    # both arms have to be visited, so no short circuiting
+                    if spill(instr.then_) | spill(instr.else_):
                         spilled = True
                 elif isinstance(instr, while_instr):
-                    if spill(instr.body) or spill(instr.test_instrs):
+                    if spill(instr.body) | spill(instr.test_instrs):
                         spilled = True
-                if instr.is_mem_to_mem():
+                if instr.is_mem_to_mem() and not (isinstance(instr, movl) and
+                        instr.var_locations[0] == instr.var_locations[1]):
+                    # (moves within a slot are dropped by _rm_nops)
                     var = "%ecx"
                     x86IR.insert(i, movl(x86IR[i].vars[0], var))
                     x86IR[i].var_locations = x86IR[i + 1].var_locations[:]
@@ -299,10 +474,9 @@ class _ProgramCompiler:
         def __update_padding(x86IR):
             for instr in x86IR:
                 if isinstance(instr, pad_args):
-                    # 8 is added here since we need to account for the initial push %ebp in
-                    # the prologue (4) + the space saved for the return address (4), on top
-                    # of the space allocated for locals
-                    instr.calc_padding(self.bytes_used + 8)
+                    # the prologue pushes %ebp (and any saved registers) after the
+                    # return address, on top of that is the space allocated for locals
+                    instr.calc_padding(self.bytes_used + abi.frame_bytes())
                     instr.assign_locations(self.vars)
                 if isinstance(instr, if_instr):
                     __update_padding(instr.then_)
@@ -351,15 +525,22 @@ class _ProgramCompiler:
                     __rm_nops(instr.test_instrs)
                     __rm_nops(instr.body)
                 elif isinstance(instr, addl):
-                    if instr.vars[0] == Const(0):
+                    if isinstance(instr.vars[0], Const) and instr.vars[0].value == 0:
                         del x86IR[i]
 
         __rm_nops(self.x86IR)
 
+    def _schedule_merges(self):
+        if CONSTANT_TIME and not PREDICATED:
+            _start_bm("scheduling")
+            self.x86IR = schedule_merges(self.x86IR, self.vars, sorted(abi.regs))
+            _end_bm("scheduling")
+
     def _compile_prologue(self):
         # type: () -> str
         main = abi.label("main")
-        return ".globl " + main + "\n" + main + ":\npushl %ebp\nmovl %esp, %ebp\nsubl $" + str(
+        saves = "".join("pushl " + reg + "\n" for reg in abi.saved_regs)
+        return ".globl " + main + "\n" + main + ":\n" + saves + "pushl %ebp\nmovl %esp, %ebp\nsubl $" + str(
             self.bytes_used) + ", %esp\n\n"
 
     def _get_x86(self):
@@ -375,12 +556,17 @@ class _ProgramCompiler:
 
     def _compile_epilogue(self):
         # type: () -> str
-        return "leave\nret\n"
+        restores = "".join("popl " + reg + "\n" for reg in reversed(abi.saved_regs))
+        return "leave\n" + restores + "ret\n"
 
     def compile(self):
         # type: () -> str
+        self._specialize_subscripts()
         self._get_x86IR()
+        self._mark_secret_branches()
+        self._unroll_loops()
         self._if_to_cmov()
+        self._hoist_loop_invariants()
         self._get_x86IR_liveness()
         self._build_interference_graph()
         self._allocate_regs()
@@ -388,11 +574,23 @@ class _ProgramCompiler:
         self._introduce_spill()
         self._update_padding()
         self._rm_nops()
-
-        asm_code = self._compile_prologue()
-        asm_code += self._get_x86()
+        self._schedule_merges()
+
+        reset_labels()
+        body = self._get_x86()
+        # main is only ever called, so nothing falls into the trampolines put
+        # before it, next to the code that jumps to them
+        asm_code = trampoline_pool()
+        asm_code += self._compile_prologue()
+        asm_code += body
+        if BENCH:
+            n_instrs = len([l for l in asm_code.splitlines()
+                            if l and not l.endswith(":") and l[0] not in ".#"])
+            print colored("%d instructions emitted" % n_instrs, "yellow")
         asm_code += "movl $0, %eax\n"  # zero out return code
         asm_code += self._compile_epilogue()
+        if abi.arch == "x86_64":
+            asm_code = widen(asm_code)
         return asm_code
 
     def compile_to_file(self, outfile):
@@ -400,26 +598,64 @@ class _ProgramCompiler:
         outfile.write(self.compile())
 
 
-def main():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description='Best python compiler ever')
     parser.add_argument("input_file", help="Name of file to compile.", type=str)
     parser.add_argument('-d', '--debug', dest='debug', action='store_true')
     parser.add_argument('-b', '--bench', dest='bench', action='store_true')
     parser.add_argument('-c', '--constant-time', dest='ct', action='store_true')
+    parser.add_argument('-p', '--predicated', dest='predicated',
+                        action='store_true',
+                        help="Constant time, merging branches with and/or "
+                             "masks instead of cmov")
+    parser.add_argument('-s', '--secret-only', dest='secret_only',
+                        action='store_true',
+                        help="Only protect branches that depend on secret "
+                             "inputs (input(), _rand_zero_or_one())")
+    parser.add_argument('-u', '--unroll', dest='unroll', type=int, default=1,
+                        help="Unroll constant time while loops this many "
+                             "times, so zigzagging is paid once per UNROLL "
+                             "iterations")
+    parser.add_argument('--ssa', dest='ssa', action='store_true',
+                        help="With -c or -p, build SSA and merge branches "
+                             "with one select per live name, instead of "
+                             "renaming what branches write")
     parser.add_argument('-t', '--target',
                         help="The target platform to compile for ('mac' or 'linux')",
                         type=str)
-    args = parser.parse_args()
+    parser.add_argument('--arch', default="i386", choices=["i386", "x86_64"],
+                        help="The instruction set to compile for")
+    return parser.parse_args(argv)
+
 
+def configure(args):
+    """
+    Sets the compiler options from parsed command line args.
+    """
     global DEBUG
     DEBUG = args.debug
     global BENCH
     BENCH = args.bench
     global CONSTANT_TIME
-    CONSTANT_TIME = args.ct
+    CONSTANT_TIME = args.ct or args.predicated
+    global PREDICATED
+    PREDICATED = args.predicated
+    global SECRET_ONLY
+    SECRET_ONLY = args.secret_only
+    global UNROLL
+    UNROLL = args.unroll
+    global SSA
+    SSA = args.ssa
 
     if args.target is not None:
-        set_abi(args.target)
+        set_abi(args.target, args.arch)
+    else:
+        set_abi(arch=args.arch)
+
+
+def main():
+    args = parse_args()
+    configure(args)
     pc = _ProgramCompiler(input_filename=args.input_file)
     with open(os.path.splitext(args.input_file)[0] + ".s", 'wb') as outfile:
         pc.compile_to_file(outfile)
@@ -1,6 +1,15 @@
 from explicate_ast import *
 from allocator import allocate
 
+
+# Runtime builders taking a count and a pointer to that many elements. The
+# first arg of these calls is the count, the rest are put in an array on the
+# stack (see `_ProgramCompiler._expr_to_x86IR`).
+STACK_ARRAY_CALLS = {
+    "create_list_from",
+    "dict_from_pairs",
+}
+
 def _desugar_stmts(stmts):
     # type: (Stmt) -> Stmt
 
@@ -140,36 +149,16 @@ def _desugar_expr(expr):
         ))
 
     elif isinstance(expr, List):
-        nodes = expr.nodes
-        num_nodes = len(nodes)
-
-        l_name = allocate()
-        def fill_list(i, nodes):
-            if len(nodes) == 0:
-                return l_name
-            else:
-                return Seq((
-                    CallFunc(Name("set_subscript"), [l_name, Const(i), _desugar_expr(nodes[0])]),
-                    fill_list(i + 1, nodes[1:])
-                ))
-        l = Let(l_name.name, CallFunc(Name("create_list"), [Const(num_nodes)]), fill_list(0, nodes))
-        return l
+        # one call copying all elements, instead of a set_subscript each
+        elems = map(_desugar_expr, expr.nodes)
+        return CallFunc(Name("create_list_from"), [Const(len(elems))] + elems)
 
     elif isinstance(expr, Dict):
-        pairs = expr.items
-
-        d_name = allocate()
-        def fill_dict(pairs):
-            if len(pairs) == 0:
-                return d_name
-            else:
-                sub, data = pairs[0]
-                return Seq((
-                    CallFunc(Name("set_subscript"), [d_name, _desugar_expr(sub), _desugar_expr(data)]),
-                    fill_dict(pairs[1:])
-                ))
-        d = Let(d_name.name, CallFunc(Name("create_dict"), []), fill_dict(pairs))
-        return d
+        # one call with all pairs, which also sizes the dict up front
+        pairs = []
+        for sub, data in expr.items:
+            pairs += [_desugar_expr(sub), _desugar_expr(data)]
+        return CallFunc(Name("dict_from_pairs"), [Const(len(expr.items))] + pairs)
 
     # Base cases
     elif isinstance(expr, Const):
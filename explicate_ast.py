@@ -5,6 +5,10 @@ int_tag  = Const(0b00)
 bool_tag = Const(0b01)
 big_tag  = Const(0b11)
 
+# mirror MASK and SHIFT in runtime/runtime.h
+tag_mask  = Const(0b11)
+tag_shift = Const(2)
+
 
 #
 # Expressions
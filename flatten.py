@@ -50,6 +50,13 @@ def _flatten_stmt(stmt):
 		for node in stmt.nodes:
 			if not isinstance(node, Name):
 				raise TypeError("Cannot assign value to non-name Node.", node)
+		if len(stmt.nodes) == 1:
+			# A single binding can take the result directly, which saves a
+			# copy (and lets `x = x + 1` become a single add)
+			flattened, expr_name = _flatten_expr(stmt.expr, True, stmt.nodes[0])
+			if isinstance(expr_name, Name) and expr_name.name == stmt.nodes[0].name:
+				return flattened
+			return flattened + [_assignment(stmt.nodes[0].name, expr_name)]
 		# Flatten the expr, then bind it to a temp name once so it is not
 		# run again for each binding.
 		flattened, expr_name = _flatten_expr(stmt.expr, True)
@@ -97,8 +104,8 @@ def _flatten_stmts(stmts):
 	return stmts_acc
 
 
-def _flatten_expr(expr, save):
-	# type: (Node) -> (List[Node], Union[Const, Name, None])
+def _flatten_expr(expr, save, target=None):
+	# type: (Node, bool, Optional[Name]) -> (List[Node], Union[Const, Name, None])
 	"""
 	Recursively sequences assignments to create an equivalent program to the
 	expr given. Returns the sequence as a list paired with the `Node` representing
@@ -107,27 +114,25 @@ def _flatten_expr(expr, save):
 	:param save: True if the result should be saved to an `Assign`, False if it
 				 should be discarded (with None returned for the result). The
 				 list is still returned if save is False.
+	:param target: Name the result of the outermost operation is saved to,
+				   instead of a new temp. Only written after all sub-expressions
+				   are evaluated.
 	:return: The list of operations that are equivalent to the given ast
 	"""
 
 	def do_save(flattened, res, name=None):
 		if save:
 			if name is None:
-				name = allocate()
+				name = target if target is not None else allocate()
 			return flattened + [_assignment(name.name, res)], name
 		else:
 			return flattened + [Discard(res)], None
 
 	if isinstance(expr, Add):
 		flattened, [left_name, right_name] = _flatten_and_sequence([expr.left, expr.right])
-
-		# this temp Var is so that the add maps more closely to the x86 addl
-		# instruction. Specifically, this ensures that it has the form `x = ? + x`
-		name = allocate()
-		flattened += [_assignment(name.name, right_name)]
-
-		res = Add((left_name, name))
-		return do_save(flattened, res, name)
+		# three address form, instruction selection picks addl/leal/sall
+		res = Add((left_name, right_name))
+		return do_save(flattened, res)
 
 	elif isinstance(expr, UnarySub):
 		flattened, [name] = _flatten_and_sequence([expr.expr])
@@ -37,6 +37,12 @@ class Graph:
         self.nodes[data].clearable = False
         self.nodes[data].color = color
 
+    def add_hint(self, data1, data2):
+        """Asks for the same color on both, e.g. for the ends of a move"""
+        if data1 != data2 and data1 in self.nodes and data2 in self.nodes:
+            self.nodes[data1].hints.append(data2)
+            self.nodes[data2].hints.append(data1)
+
     def add_edge(self, data1, data2):
         """Creates a undirected edge between nodes associated with each element in datas
         """
@@ -63,6 +69,7 @@ class Graph:
             # TODO: Figure out why on earth negating saturation takes longer
             return node.priority, saturation(node)
 
+        allowed = set(colors)
         w = PriorityQueue(priority)
         for node in self.nodes.values():
             node.neighbor_colors = set()
@@ -71,7 +78,7 @@ class Graph:
         while w:
             u = w.pop()
             try:
-                u.color = next(c for c in colors if c not in u.neighbor_colors)
+                u.color = self._free_color(u, colors, allowed, u.neighbor_colors)
                 for neighbor in u.neighbors:
                     if neighbor.color is None:
                         neighbor.neighbor_colors.add(u.color)
@@ -81,11 +88,51 @@ class Graph:
                 # Happens if all colors are taken
                 if generate_color is not None:
                     colors.append(generate_color())
+                    allowed.add(colors[-1])
                     w.insert(u)
                     continue
                 else:
                     raise Uncolorable(u.data)
 
+    def color_in_order(self, order, colors, generate_color=None):
+        # type: ([str], list) -> ()
+        """
+        Greedily gives each uncolored node, in order, the first color none of
+        its neighbors has. Ordered by definition, the interference graph of an
+        SSA program is chordal and this uses as few colors as possible, in
+        linear time.
+        """
+        allowed = set(colors)
+        for data in order:
+            u = self.nodes.get(data)
+            if u is None or u.color is not None:
+                continue
+            taken = set(neighbor.color for neighbor in u.neighbors)
+            try:
+                u.color = self._free_color(u, colors, allowed, taken)
+            except StopIteration:
+                # Happens if all colors are taken
+                if generate_color is None:
+                    raise Uncolorable(data)
+                u.color = generate_color()
+                if u.color not in allowed:
+                    colors.append(u.color)
+                    allowed.add(u.color)
+
+    def _free_color(self, u, colors, allowed, taken):
+        # type: (Node, list, set, set) -> str
+        # raises StopIteration if all colors are taken
+        for data in u.hints:
+            color = self.nodes[data].color
+            if color is not None and color not in taken and color in allowed:
+                return color
+        return next(c for c in colors if c not in taken)
+
+    def clear_colors(self):
+        for node in self.nodes.values():
+            if node.clearable:
+                node.color = None
+
     def color_of(self, data):
         return self.nodes[data].color
 
@@ -104,6 +151,8 @@ class Node:
         self.neighbors = set()
         self.clearable = True
         self.priority = 2
+        # names this would like to share a color with
+        self.hints = []
 
     def __eq__(self, other):
         return hash(self) == hash(other)
@@ -1,40 +1,127 @@
 from instructions import *
 from compiler.ast import Name, Const
+from liveness import instr_writes
 from utils import flat_map
 
 
-def if_to_cmov(instr, outer_test = None):
-    if isinstance(instr, if_instr):
+# Nested ifs need no combined test: their merges write the renamed copies of
+# the branch they are in, which the outer merges then pick from.
+def if_to_cmov(instr, predicated = False):
+    if isinstance(instr, if_instr) and not instr.secret:
+        instr.then_ = flat_map(lambda i: if_to_cmov(i, predicated), instr.then_)
+        instr.else_ = flat_map(lambda i: if_to_cmov(i, predicated), instr.else_)
+        return [instr]
+
+    elif isinstance(instr, if_instr):
+        test = instr.vars[0]
         saved_test = Name("if#%d_test" % instr.tag)
         res = []
-        res.append(movl(instr.vars[0], saved_test))
-        if outer_test:
-            # make this test result in 0 if outer test was 0
-            res.append(movl(Const(0), "%ecx"))
-            res.append(cmpl(Const(0), outer_test))
-            res.append(cmove("%ecx", saved_test))
-        const_then = flat_map(lambda i: if_to_cmov(i, outer_test), instr.then_)
-        const_else = flat_map(lambda i: if_to_cmov(i, outer_test), instr.else_)
-        res += const_then
-        res += const_else
-        # then
-        for old, new in instr.then_renamings.iteritems():
-            res.append(movl(Name(old), "%ecx"))
-            res.append(cmpl(Const(0), saved_test))
-            res.append(cmovne(new, "%ecx"))
-            res.append(movl("%ecx", Name(old)))
-        # else
-        for old, new in instr.else_renamings.iteritems():
-            res.append(movl(Name(old), "%ecx"))
-            res.append(cmpl(Const(0), saved_test))
-            res.append(cmove(new, "%ecx"))
-            res.append(movl("%ecx", Name(old)))
+        if predicated and isinstance(test, Const):
+            res.append(movl(Const(int(test.value != 0)), saved_test))
+        elif predicated:
+            # normalize the test to 0/1 so it can be turned into masks below
+            res.append(cmpl(Const(0), test))
+            res.append(setne_cl())
+            res.append(movzbl_cl(saved_test))
+        elif isinstance(test, Name) and \
+                test.name in _branch_writes(instr.then_ + instr.else_):
+            # names dead after the if aren't renamed, so the test can change
+            res.append(movl(test, saved_test))
+        else:
+            saved_test = test
+        res += flat_map(lambda i: if_to_cmov(i, predicated), instr.then_)
+        res += flat_map(lambda i: if_to_cmov(i, predicated), instr.else_)
+        if predicated:
+            res += _mask_merges(instr, saved_test)
+        else:
+            res += _cmov_merges(instr, saved_test)
         return res
 
     elif isinstance(instr, while_instr):
-        instr.test_instrs = flat_map(if_to_cmov, instr.test_instrs)
-        instr.body = flat_map(if_to_cmov, instr.body)
+        instr.test_instrs = flat_map(lambda i: if_to_cmov(i, predicated=predicated), instr.test_instrs)
+        instr.body = flat_map(lambda i: if_to_cmov(i, predicated=predicated), instr.body)
         return [instr]
 
     else:
-        return [instr]
\ No newline at end of file
+        return [instr]
+
+
+def _branch_writes(instrs):
+    # type: ([x86instruction]) -> {str}
+    # including what the merges of nested ifs will write
+    writes = set()
+    for i in instrs:
+        writes |= instr_writes(i)
+        if isinstance(i, if_instr):
+            writes |= set(getattr(i, "then_renamings", ()))
+            writes |= set(getattr(i, "else_renamings", ()))
+            writes |= _branch_writes(i.then_ + i.else_)
+        elif isinstance(i, while_instr):
+            writes |= _branch_writes(i.test_instrs + i.body)
+    return writes
+
+
+def _merges(instr):
+    # type: (if_instr) -> [(str, Name, Name)]
+    """
+    What to merge into each name: its then and else values, the name itself
+    for a branch that didn't write it.
+    """
+    names = set(instr.then_renamings) | set(instr.else_renamings)
+    return [(old, instr.then_renamings.get(old, Name(old)),
+             instr.else_renamings.get(old, Name(old)))
+            for old in sorted(names)]
+
+
+def _cmov_merges(instr, test):
+    # type: (if_instr, Node) -> [x86instruction]
+    """
+    Selects every merged name with one cmov, after a single compare of the
+    test: movl only moves, so the flags hold until the last one.
+    """
+    res = []
+    merges = _merges(instr)
+    if not merges:
+        return res
+    if isinstance(test, Const):
+        for old, then_, else_ in merges:
+            res.append(movl(then_ if test.value != 0 else else_, Name(old)))
+        return res
+    res.append(cmpl(Const(0), test))
+    for old, then_, else_ in merges:
+        res.append(movl(else_, "%ecx"))
+        res.append(cmovne(then_, "%ecx"))
+        res.append(movl("%ecx", Name(old)))
+    return res
+
+
+def _mask_merges(instr, saved_test):
+    # type: (if_instr, Name) -> [x86instruction]
+    """
+    Merges the renamed branch results with and/or over 0/-1 masks instead of
+    cmov, so no flags are consumed: x = (then & mask) | (else & ~mask).
+    `saved_test` has to hold the normalized (0/1) test.
+    """
+    mask = Name("if#%d_mask" % instr.tag)
+    inv_mask = Name("if#%d_inv_mask" % instr.tag)
+    pick = Name("if#%d_pick" % instr.tag)
+    res = []
+    merges = _merges(instr)
+    if not merges:
+        return res
+    # 1 -> -1, 0 -> 0
+    res.append(movl(saved_test, mask))
+    res.append(negl(mask))
+    # 1 -> 0, 0 -> -1
+    res.append(movl(saved_test, inv_mask))
+    res.append(addl(Const(-1), inv_mask))
+
+    for old, then_, else_ in merges:
+        res += [
+            movl(then_, pick),
+            andl(mask, pick),
+            movl(else_, Name(old)),
+            andl(inv_mask, Name(old)),
+            orl(pick, Name(old)),
+        ]
+    return res
@@ -1,31 +1,68 @@
+import re
 import compiler
-from abi import abi
-from allocator import allocate
+from abi import abi, INT_RESULT_CALLS
 
 ZIGZAG = True
 
-caller_save_regs = {
-	"%eax",
-	"%edx"
-}
-
-callee_save_regs = {
-	"%edi",
-	"%esi"
-}
-
-regs = caller_save_regs | callee_save_regs
-
-reserved_regs = {
-	"%ebx",
-	"%ecx",
-	"%esp",
-	"%ebp"
-}
+# Ifs and whiles are numbered in the order they are emitted in, which is the
+# pre-order of the program, from 1 for each compilation: the same program
+# always gets the same labels.
+_label_count = 0
+
+# The trampolines of zigzag constructs, laid out together by
+# `trampoline_pool` rather than between the code they jump back into. All of
+# them share one `jmp *%ebx`: which trampoline ran says nothing about the
+# secret, as both branches go through the same ones.
+_trampolines = []
+EBX_TRAMPOLINE = "zz_ebx"
+# loop heads start a 16 byte block, unless that takes more than 10 bytes of
+# padding (as gcc does)
+LOOP_ALIGN = ".p2align 4,,10"
+
+def trampoline_pool():
+	# type: () -> str
+	"""
+	The trampolines emitted since the last call, in one aligned block, to be
+	placed where execution never falls into it.
+	"""
+	global _trampolines
+	if not _trampolines:
+		return ""
+	x86str = ".p2align 4\n"
+	for label, target in _trampolines:
+		x86str += label + ": jmp " + target + "\n"
+	x86str += EBX_TRAMPOLINE + ": jmp *%ebx\n"
+	_trampolines = []
+	return x86str
+
+def reset_labels():
+	# type: () -> ()
+	global _label_count, _trampolines
+	_label_count = 0
+	_trampolines = []
+
+def _label_id():
+	# type: () -> str
+	global _label_count
+	_label_count += 1
+	return str(_label_count)
+
+def _trampoline(label, target):
+	# type: (str, str) -> str
+	_trampolines.append((label, target))
+	return label
 
 class UninitializedPadding(RuntimeError):
 	pass
 
+def _test_x86(location):
+	# type: (str) -> str
+	# cmp can't take an immediate as its second operand, so constant tests
+	# (e.g. `x if 8 else 3`) are loaded into %ecx first
+	if location.startswith("$"):
+		return "movl " + location + ", %ecx\ncmpl $0, %ecx\n"
+	return "cmpl $0, " + location + "\n"
+
 class x86instruction(object):
 	def __init__(self):
 		self.instr = ""
@@ -145,6 +182,48 @@ class addl(x86instruction):
 	def vars_read(self):
 		return self.vars_names()
 
+class leal(x86instruction):
+	"""
+	Three address add, `target = left + right`, as `leal (left,right), target`.
+	leal only takes registers, so other locations fall back to movl/addl.
+	"""
+	def __init__(self, left_var, right_var, target):
+		super(leal, self).__init__()
+		self.instr = "leal"
+		self.vars = [left_var, right_var, target]
+
+	def vars_written(self):
+		return self.vars_names(2)
+
+	def vars_read(self):
+		return self.vars_names(0) + self.vars_names(1)
+
+	def is_mem_to_mem(self):
+		# memory operands are handled in get_x86
+		return False
+
+	def get_x86(self):
+		# type () -> str
+		[left, right, target] = self.var_locations
+		if left.startswith("$"):
+			left, right = right, left
+		if target.startswith("%") and left.startswith("%"):
+			if right.startswith("$"):
+				return "leal %s(%s), %s" % (right[1:], left, target)
+			if right.startswith("%"):
+				return "leal (%s,%s), %s" % (left, right, target)
+		def in_mem(location):
+			return not location.startswith("%") and not location.startswith("$")
+
+		# target may share a location with an operand that dies here
+		if target == left and not (in_mem(target) and in_mem(right)):
+			return "addl %s, %s" % (right, target)
+		if target == right and not (in_mem(target) and in_mem(left)):
+			return "addl %s, %s" % (left, target)
+		if target.startswith("%") and target != right:
+			return "movl %s, %s\naddl %s, %s" % (left, target, right, target)
+		return "movl %s, %%ecx\naddl %s, %%ecx\nmovl %%ecx, %s" % (left, right, target)
+
 class negl(x86instruction):
 	def __init__(self, var):
 		super(negl, self).__init__()
@@ -158,17 +237,27 @@ class negl(x86instruction):
 		return self.vars_names()
 
 class call(x86instruction):
-	def __init__(self, instr):
+	def __init__(self, instr, n_reg_args=0):
+		# n_reg_args: how many of `abi.call_regs(instr)` hold arguments
 		super(call, self).__init__()
-		self.instr = "call " + abi.label(instr)
+		self.instr = "call " + abi.call_label(instr)
+		self.func = instr
 		self.vars = []
 		self.affected_registers = ["%eax"]
+		self.arg_regs = abi.call_regs(instr)[:n_reg_args]
+
+	def get_x86(self):
+		# type () -> str
+		x86 = super(call, self).get_x86()
+		if abi.arch == "x86_64" and self.func in INT_RESULT_CALLS:
+			x86 += "\ncltq"
+		return x86
 
 	def vars_written(self):
 		return self.affected_registers
 
 	def vars_read(self):
-		return []
+		return self.arg_regs
 
 
 class pushl(x86instruction):
@@ -233,6 +322,8 @@ class if_instr(x86instruction):
 		self.then_ = then_
 		self.else_ = else_
 		self.affected_registers = ["%eax", "%ecx"]  # al, cl
+		# public branches (see secret_taint_pass) are not zigzagged
+		self.secret = True
 
 	def assign_locations(self, all_locations):
 		# type: (dict) -> ()
@@ -244,41 +335,37 @@ class if_instr(x86instruction):
 
 	def get_x86(self):
 		# type () -> str
-		lname = allocate().name[10:]
+		lname = _label_id()
 		else_label = "elselabel_" + lname
 		end_label = "endlabel_" + lname
-		if ZIGZAG:
-			start_label = "start_" + lname
-			startj_label = start_label + ".j"
+		if ZIGZAG and self.secret:
+			startj_label = "start_" + lname + ".j"
 			then_label = "thenlabel_" + lname
 			thenj_label = then_label + ".j"
 			trampoline_to_thenj = "zz" + lname + "_thenj"
-			trampoline_to_ebx = "zz" + lname + "_ebx"
 
-			x86str = "# trampoline " + lname + "\n"
-			x86str += "jmp " + start_label + "\n" # change from original zigzagger
-			x86str += trampoline_to_thenj + ": jmp " + thenj_label + "\n"
-			x86str += trampoline_to_ebx + ": jmp *%ebx\n"
+			# the trampolines are out of line (see `trampoline_pool`), so
+			# there is nothing to jump over
+			x86str = "# zigzag " + lname + "\n"
 			# TODO: cmpl, movl etc from zigzagging should be stored rather than
 			# just added to x86 string to be able to reason about it for const-time compilation
-			x86str += start_label + ":\n"
 			x86str += "movl $" + then_label + ", %ebx\n"
-			x86str += "movl $" + else_label + ", %ecx\n"
-			x86str += "cmp $0, " + self.var_locations[0] + "\n"
+			x86str += _test_x86(self.var_locations[0])
 			# x86str += "cmove $" + else_label + ", %ebx\n"
+			x86str += "movl $" + else_label + ", %ecx\n"
 			x86str += "cmove %ecx, %ebx\n"
-			x86str += startj_label + ":\njmp " + trampoline_to_thenj + "\n"
+			x86str += startj_label + ":\njmp " + _trampoline(trampoline_to_thenj, thenj_label) + "\n"
 			x86str += then_label + ":\n"
 			for instr in self.then_:
 				x86str += instr.get_x86() + "\n"
 			x86str += "movl $" + end_label + ", %ebx\n"
-			x86str += thenj_label + ":\njmp " + trampoline_to_ebx + "\n"
+			x86str += thenj_label + ":\njmp " + EBX_TRAMPOLINE + "\n"
 			x86str += else_label + ":\n"
 			for instr in self.else_:
 				x86str += instr.get_x86() + "\n"
 			x86str += end_label + ":\n"
 		else:
-			x86str = "cmpl $0, " + self.var_locations[0] + "\n"
+			x86str = _test_x86(self.var_locations[0])
 			x86str += "je " + else_label + "\n"
 			for instr in self.then_:
 				x86str += instr.get_x86() + "\n"
@@ -393,6 +480,13 @@ class movzbl_cl(x86instruction):
 		self.instr = "movzbl %cl,"
 		self.vars = [var]
 
+	def get_x86(self):
+		# type () -> str
+		# movzbl can only write to a register, so go through %ecx if spilled
+		if not self.var_locations[0].startswith("%"):
+			return "movzbl %cl, %ecx\nmovl %ecx, " + self.var_locations[0]
+		return super(movzbl_cl, self).get_x86()
+
 	def vars_written(self):
 		return self.vars_names()
 
@@ -431,6 +525,8 @@ class while_instr(x86instruction):
 		self.test_instrs = test_instrs
 		self.body = body
 		self.affected_registers = ["%eax", "%ecx"]  # al, cl
+		# public loops (see secret_taint_pass) are not zigzagged
+		self.secret = True
 
 	def assign_locations(self, all_locations):
 		# type: (dict) -> ()
@@ -442,7 +538,7 @@ class while_instr(x86instruction):
 
 	def get_x86(self):
 		# type () -> str
-		if ZIGZAG:
+		if ZIGZAG and self.secret:
 			"""
 			test_label:
 				TEST_CODE
@@ -454,33 +550,27 @@ class while_instr(x86instruction):
 				BODY_CODE
 				mov test_label, %ebx
 			body_label.j:
-				jmp zz2                    zz2:
-			end_label:                         jmp %ebx
+				jmp zz_ebx                 zz_ebx:
+			end_label:                         jmp *%ebx
 			"""
-			test_label = "test_label_" + allocate().name
-			body_name = allocate().name
-			body_label = "body_label_" + body_name
-			body_label_j = "body_label_j_" + body_name
-			end_label = "end_label_" + allocate().name
-			zz1_label = "zz1_" + allocate().name
-			zz2_label = "zz2_" + allocate().name
-
-			x86str = "jmp " + test_label + "\n"
+			lname = _label_id()
+			test_label = "test_label_" + lname
+			body_label = "body_label_" + lname
+			body_label_j = "body_label_j_" + lname
+			end_label = "end_label_" + lname
+			zz1_label = "zz1_" + lname
 
-			# Trampoline
-			x86str += zz1_label + ":\n"
-			x86str += "jmp " + body_label_j + "\n"
-
-			x86str += zz2_label + ":\n"
-			x86str += "jmp *%ebx\n"
+			# the trampolines are out of line (see `trampoline_pool`)
+			_trampoline(zz1_label, body_label_j)
+			x86str = LOOP_ALIGN + "\n"
 
 			# Loop
 			x86str += test_label + ":\n"
 			for instr in self.test_instrs:
 				x86str += instr.get_x86() + "\n"
 			x86str += "movl $" + body_label + ", %ebx\n"
+			x86str += _test_x86(self.var_locations[0])
 			x86str += "movl $" + end_label + ", %ecx\n"
-			x86str += "cmpl $0, " + self.var_locations[0] + "\n"
 			x86str += "cmove %ecx, %ebx\n"
 			x86str += "jmp " + zz1_label + "\n"
 
@@ -490,17 +580,18 @@ class while_instr(x86instruction):
 			x86str += "movl $" + test_label + ", %ebx\n"
 
 			x86str += body_label_j + ":\n"
-			x86str += "jmp " + zz2_label + "\n"
+			x86str += "jmp " + EBX_TRAMPOLINE + "\n"
 
 			x86str += end_label + ":\n"
 
 		else:
-			start_label = allocate().name
-			end_label = allocate().name
-			x86str = "\n" + start_label + ":\n"
+			lname = _label_id()
+			start_label = "while_label_" + lname
+			end_label = "endwhile_label_" + lname
+			x86str = "\n" + LOOP_ALIGN + "\n" + start_label + ":\n"
 			for instr in self.test_instrs:
 				x86str += instr.get_x86() + "\n"
-			x86str += "cmpl $0, " + self.var_locations[0] + "\n"
+			x86str += _test_x86(self.var_locations[0])
 			x86str += "je " + end_label + "\n"
 			for instr in self.body:
 				x86str += instr.get_x86() + "\n"
@@ -525,4 +616,23 @@ class while_instr(x86instruction):
 		for instr in self.body:
 			res += "|-" + instr.__str__() + "\n"
 		res += "|----end" + super(while_instr, self).__str__() + "----|"
-		return res
\ No newline at end of file
+		return res
+
+_WIDE_MNEMONIC = re.compile(r"\b(mov|add|sub|lea|neg|sal|sar|and|or|cmp|push|pop)l\b")
+_WIDE_REG = re.compile(r"%e(ax|bx|cx|dx|si|di|sp|bp)\b")
+_WIDE_NEW_REG = re.compile(r"%(r\d+)d\b")
+_LABEL_ADDRESS = re.compile(r"\bmovq \$([A-Za-z_.][\w.]*), ")
+
+def widen(asm):
+	# type: (str) -> str
+	"""
+	Turns the 32 bit assembly the instructions emit into x86_64 assembly:
+	operations work on whole registers (`addl %eax, %edx` becomes
+	`addq %rax, %rdx`), and labels are loaded relative to %rip so the
+	binary can be position independent.
+	"""
+	asm = _WIDE_MNEMONIC.sub(r"\1q", asm)
+	asm = asm.replace("movzbl", "movzbq")
+	asm = _WIDE_REG.sub(r"%r\1", asm)
+	asm = _WIDE_NEW_REG.sub(r"%\1", asm)
+	return _LABEL_ADDRESS.sub(r"leaq \1(%rip), ", asm)
@@ -1,5 +1,6 @@
 from graph import Graph
 from instructions import *
+from abi import abi
 from compiler.ast import Name
 
 
@@ -9,7 +10,7 @@ def interference(instructions, g=None):
     if g is None:
         g = Graph()
     # Color registers
-    for reg in caller_save_regs | callee_save_regs | reserved_regs:
+    for reg in abi.regs | abi.reserved_regs:
         g.insert_colored(reg, reg)
 
     def add_edges(data, guard=None):
@@ -43,6 +44,9 @@ def interference(instructions, g=None):
         elif isinstance(i, addl):
             [t] = i.vars_written()
             add_edges(t)
+        elif isinstance(i, leal):
+            [_, _, t] = i.vars
+            add_edges(t)
         elif isinstance(i, negl):
             [t] = i.vars
             add_edges(t)
@@ -59,7 +63,7 @@ def interference(instructions, g=None):
             [_, t] = i.vars
             add_edges(t)
         elif isinstance(i, call):
-            for reg in caller_save_regs:
+            for reg in abi.caller_save_regs:
                 add_edges(reg)
         elif isinstance(i, pad_args):
             # "%esp" is written and read, but it is reserved, so no interference
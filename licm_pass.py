@@ -0,0 +1,103 @@
+from instructions import *
+from liveness import instr_reads, instr_writes, live_before, live_at_loop_head
+
+
+# Instructions without side effects besides writing their destination.
+_PURE_INSTRS = {movl, addl, leal, negl, sall, sarl, andl, orl}
+
+
+def hoist_loop_invariants(x86IR, live_after=frozenset()):
+    # type: ([x86instruction], {str}) -> [x86instruction]
+    """
+    Loop-invariant code motion: moves pure instructions at the top level of a
+    `while_instr` whose operands are not changed by the loop into a preheader
+    right before it. Inner loops are handled first, so invariants can move
+    out of several loops.
+    """
+    res = []
+    live = set(live_after)
+    for instr in reversed(x86IR):
+        if isinstance(instr, while_instr):
+            head = live_at_loop_head(instr, live)
+            after_test = live | set(instr.vars_names()) | \
+                live_before(instr.body, head)
+            instr.body = hoist_loop_invariants(instr.body, head)
+            instr.test_instrs = hoist_loop_invariants(instr.test_instrs, after_test)
+            preheader = _hoist(instr, live)
+            res = preheader + [instr] + res
+            live = live_before(preheader + [instr], live)
+        elif isinstance(instr, if_instr):
+            instr.then_ = hoist_loop_invariants(instr.then_, live)
+            instr.else_ = hoist_loop_invariants(instr.else_, live)
+            res = [instr] + res
+            live = live_before([instr], live)
+        else:
+            res = [instr] + res
+            live = live_before([instr], live)
+    return res
+
+
+def _is_candidate(instr):
+    # type: (x86instruction) -> bool
+    # registers are shared by calls, zigzagging and merges, so leave them be
+    return type(instr) in _PURE_INSTRS and \
+        not any(isinstance(v, str) for v in instr.vars)
+
+
+def _hoist(loop, live_after):
+    # type: (while_instr, {str}) -> [x86instruction]
+    """
+    Removes the invariant instructions from loop and returns them in order.
+
+    An instruction is kept in the hoisted set while:
+    - every name it reads is either not written in the loop, or only by
+      hoisted instructions, the first of which comes before it,
+    - its destination is not the loop test, is only written in the loop by
+      hoisted instructions, and is only read by other instructions after the
+      last of those writes,
+    - its destination is not live after the loop, unless it is in the test,
+      which runs at least once.
+    """
+    n_test = len(loop.test_instrs)
+    seq = loop.test_instrs + loop.body
+    reads = [instr_reads(i) for i in seq]
+    writes = [instr_writes(i) for i in seq]
+    test_names = set(loop.vars_names())
+
+    def positions(sets, name):
+        return [p for p, s in enumerate(sets) if name in s]
+
+    hoisted = set(p for p, i in enumerate(seq) if _is_candidate(i))
+    changed = True
+    while changed:
+        changed = False
+        for p in sorted(hoisted):
+            instr = seq[p]
+            ok = True
+            for name in reads[p]:
+                writers = positions(writes, name)
+                if any(w not in hoisted for w in writers):
+                    ok = False
+                if writers and min(writers) >= p:
+                    ok = False
+            for name in writes[p]:
+                writers = positions(writes, name)
+                if name in test_names:
+                    ok = False
+                if p >= n_test and name in live_after:
+                    ok = False
+                if any(w not in hoisted for w in writers):
+                    ok = False
+                for r in positions(reads, name):
+                    if r in hoisted:
+                        if r < min(writers):
+                            ok = False
+                    elif r <= max(writers):
+                        ok = False
+            if not ok:
+                hoisted.discard(p)
+                changed = True
+
+    loop.test_instrs = [i for p, i in enumerate(seq[:n_test]) if p not in hoisted]
+    loop.body = [i for p, i in enumerate(seq) if p >= n_test and p not in hoisted]
+    return [seq[p] for p in sorted(hoisted)]
@@ -0,0 +1,112 @@
+from instructions import *
+
+
+def instr_reads(instr):
+    # type: (x86instruction) -> {str}
+    """
+    Names read by instr, including everything read inside of nested control
+    flow.
+    """
+    reads = set(instr.vars_read())
+    if isinstance(instr, if_instr):
+        for i in instr.then_ + instr.else_:
+            reads |= instr_reads(i)
+    elif isinstance(instr, while_instr):
+        for i in instr.test_instrs + instr.body:
+            reads |= instr_reads(i)
+    return reads
+
+
+def instr_writes(instr):
+    # type: (x86instruction) -> {str}
+    """
+    Names written by instr, including everything written inside of nested
+    control flow.
+    """
+    writes = set(instr.vars_written())
+    if isinstance(instr, if_instr):
+        for i in instr.then_ + instr.else_:
+            writes |= instr_writes(i)
+    elif isinstance(instr, while_instr):
+        for i in instr.test_instrs + instr.body:
+            writes |= instr_writes(i)
+    return writes
+
+
+def live_before(instrs, live_after):
+    # type: ([x86instruction], {str}) -> {str}
+    """
+    Names live before running instrs, given the names live after them.
+    """
+    live = set(live_after)
+    for instr in reversed(instrs):
+        live = live_before_instr(instr, live)
+    return live
+
+
+def live_before_instr(instr, live_after):
+    # type: (x86instruction, {str}) -> {str}
+    if isinstance(instr, if_instr):
+        live = live_before(instr.then_, live_after) | \
+            live_before(instr.else_, live_after)
+        return live | set(instr.vars_read())
+    elif isinstance(instr, while_instr):
+        return live_at_loop_head(instr, live_after)
+    else:
+        return (live_after - set(instr.vars_written())) | set(instr.vars_read())
+
+
+def live_at_loop_head(instr, live_after):
+    # type: (while_instr, {str}) -> {str}
+    """
+    Names live before the test of a while loop, i.e. both on entry and after
+    each run of the body. Iterates until the loop carried names settle.
+    """
+    head = set()
+    while True:
+        after_test = live_after | set(instr.vars_names()) | \
+            live_before(instr.body, head)
+        new_head = live_before(instr.test_instrs, after_test)
+        if new_head == head:
+            return head
+        head = new_head
+
+
+def annotate_liveness(instrs, live_after):
+    # type: ([x86instruction], {str}) -> {str}
+    """
+    Sets `live_vars_after` on instrs and everything nested in them, exactly:
+    the end of a loop body has what is live at the loop head after it,
+    rather than everything live anywhere in the loop. Returns the names live
+    before instrs.
+    """
+    live = set(live_after)
+    for instr in reversed(instrs):
+        instr.live_vars_after = live
+        if isinstance(instr, if_instr):
+            annotate_liveness(instr.then_, live)
+            annotate_liveness(instr.else_, live)
+        elif isinstance(instr, while_instr):
+            head = live_at_loop_head(instr, live)
+            after_test = live | set(instr.vars_names()) | \
+                live_before(instr.body, head)
+            annotate_liveness(instr.test_instrs, after_test)
+            annotate_liveness(instr.body, head)
+        live = live_before_instr(instr, live)
+    return live
+
+
+def max_live(instrs):
+    # type: ([x86instruction]) -> int
+    """
+    The most names live at once after any of instrs, from `live_vars_after`.
+    """
+    most = 0
+    for instr in instrs:
+        live = [name for name in instr.live_vars_after if name[0] != "%"]
+        most = max(most, len(live))
+        if isinstance(instr, if_instr):
+            most = max(most, max_live(instr.then_), max_live(instr.else_))
+        elif isinstance(instr, while_instr):
+            most = max(most, max_live(instr.test_instrs), max_live(instr.body))
+    return most
@@ -1,5 +1,6 @@
 from instructions import *
 from compiler.ast import Name
+from liveness import live_before, live_at_loop_head
 from utils import union, keys_to_dict
 import copy
 
@@ -7,10 +8,28 @@ import copy
 IF_LEVEL = 0
 
 
+def rm_cf_name_collisions_all(instrs, live_after=frozenset()):
+    # type: ([x86instruction], {str}) -> [x86instruction]
+    """
+    `rm_cf_name_collisions` over a list of instructions, with the names live
+    after each of them.
+    """
+    res = []
+    live = set(live_after)
+    for instr in reversed(instrs):
+        res.append(rm_cf_name_collisions(instr, live))
+        live = live_before([instr], live)
+    res.reverse()
+    return res
+
+
 # Remove name collisions resulting from different control flow paths being
 # followed on different executions.
-def rm_cf_name_collisions(i):
-    # type: (x86instruction) -> x86instruction
+# Only names live after an if need to be renamed and merged back. Both
+# branches run, then first, so a name the then branch writes is also renamed
+# if the else branch reads its old value.
+def rm_cf_name_collisions(i, live_after=frozenset()):
+    # type: (x86instruction, {str}) -> x86instruction
     def renamings(written_in_then, written_in_else):
         # type: ({str}, {str}) -> ({str: Name}, {str: Name})
         # creates dictionaries of renamings
@@ -20,19 +39,30 @@ def rm_cf_name_collisions(i):
             return Name("if#%d_else_" % IF_LEVEL + name)
         return keys_to_dict(written_in_then, thenify), keys_to_dict(written_in_else, elsify)
 
-    if isinstance(i, if_instr):
+    if isinstance(i, if_instr) and not i.secret:
+        # public branches stay branches, so both sides never run
+        i.then_ = rm_cf_name_collisions_all(i.then_, live_after)
+        i.else_ = rm_cf_name_collisions_all(i.else_, live_after)
+        return i
+
+    elif isinstance(i, if_instr):
         global IF_LEVEL
         IF_LEVEL += 1
         tag = IF_LEVEL
-        then_vars_written = union(map(vars_written, i.then_))
-        else_vars_written = union(map(vars_written, i.else_))
+        live_into_else = live_before(i.else_, live_after)
+        then_vars_written = union(map(vars_written, i.then_)) & (live_after | live_into_else)
+        else_vars_written = union(map(vars_written, i.else_)) & live_after
         then_renamings, else_renamings = renamings(then_vars_written, else_vars_written)
         renamed_then = map(lambda i_then: rename(then_renamings, i_then), i.then_)
         renamed_else = map(lambda i_else: rename(else_renamings, i_else), i.else_)
         renamed_then_inits = [movl(Name(old), new) for old, new in then_renamings.iteritems()]
         renamed_else_inits = [movl(Name(old), new) for old, new in else_renamings.iteritems()]
-        safe_then = renamed_then_inits + map(lambda i_renamed_then: rm_cf_name_collisions(i_renamed_then), renamed_then)
-        safe_else = renamed_else_inits + map(lambda i_renamed_else: rm_cf_name_collisions(i_renamed_else), renamed_else)
+        # the renamed copies are what is live after the branches now
+        then_live_after = set(live_after) | live_into_else
+        then_live_after |= set(new.name for new in then_renamings.values())
+        else_live_after = set(live_after) | set(new.name for new in else_renamings.values())
+        safe_then = renamed_then_inits + rm_cf_name_collisions_all(renamed_then, then_live_after)
+        safe_else = renamed_else_inits + rm_cf_name_collisions_all(renamed_else, else_live_after)
         test = i.vars[0]
         collisionless_if = if_instr(test, safe_then, safe_else)
         collisionless_if.then_renamings = then_renamings
@@ -42,8 +72,10 @@ def rm_cf_name_collisions(i):
         return collisionless_if
 
     elif isinstance(i, while_instr):
-        i.test_instrs = map(rm_cf_name_collisions, i.test_instrs)
-        i.body = map(rm_cf_name_collisions, i.body)
+        head = live_at_loop_head(i, live_after)
+        after_test = set(live_after) | set(i.vars_names()) | live_before(i.body, head)
+        i.test_instrs = rm_cf_name_collisions_all(i.test_instrs, after_test)
+        i.body = rm_cf_name_collisions_all(i.body, head)
         return i
 
     else:
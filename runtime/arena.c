@@ -0,0 +1,137 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "arena.h"
+
+#define N_CLASSES (ARENA_MAX_SMALL / ARENA_ALIGN)
+#define DEFAULT_CHUNK (1 << 20)
+
+struct size_class {
+  char* next;
+  char* end;
+  void* free; /* freed blocks, each starting with the next one */
+};
+
+static struct size_class classes[N_CLASSES];
+static char initialized;
+static char enabled;
+static size_t chunk_size;
+
+static struct {
+  unsigned long allocs;       /* objects handed out */
+  unsigned long small_allocs; /* of which bumped out of a chunk */
+  unsigned long chunks;
+  unsigned long requested;    /* bytes asked for */
+  unsigned long reused;       /* small allocations taken from a free list */
+  unsigned long live;         /* bytes held from malloc */
+  unsigned long peak;
+} stats;
+
+static void print_stats()
+{
+  fprintf(stderr, "arena: %lu allocations (%lu small, %lu reused), "
+          "%lu bytes requested\n",
+          stats.allocs, stats.small_allocs, stats.reused, stats.requested);
+  fprintf(stderr, "arena: %lu chunks, peak %lu bytes\n",
+          stats.chunks, stats.peak);
+}
+
+static void init()
+{
+  char* env;
+  initialized = 1;
+  env = getenv("PYY_ARENA");
+  enabled = !(env && strcmp(env, "0") == 0);
+  env = getenv("PYY_ARENA_CHUNK");
+  chunk_size = env ? strtoul(env, NULL, 10) : DEFAULT_CHUNK;
+  if (chunk_size < ARENA_MAX_SMALL)
+    chunk_size = ARENA_MAX_SMALL;
+  env = getenv("PYY_ALLOC_STATS");
+  if (env && strcmp(env, "0") != 0)
+    atexit(print_stats);
+}
+
+static void* checked_malloc(size_t size)
+{
+  void* p = malloc(size);
+  if (!p) {
+    printf("error, out of memory\n");
+    exit(1);
+  }
+  stats.live += size;
+  if (stats.live > stats.peak)
+    stats.peak = stats.live;
+  return p;
+}
+
+static size_t round_up(size_t size)
+{
+  return (size + ARENA_ALIGN - 1) & ~(size_t)(ARENA_ALIGN - 1);
+}
+
+void* arena_alloc(size_t size)
+{
+  struct size_class* c;
+  void* p;
+
+  if (!initialized)
+    init();
+  stats.allocs++;
+  stats.requested += size;
+
+  size = round_up(size ? size : 1);
+  if (!enabled || size > ARENA_MAX_SMALL)
+    return checked_malloc(size);
+
+  stats.small_allocs++;
+  c = &classes[size / ARENA_ALIGN - 1];
+  if (c->free) {
+    stats.reused++;
+    p = c->free;
+    c->free = *(void**)p;
+    return p;
+  }
+  if (c->end - c->next < (long)size) {
+    /* malloc is at least ARENA_ALIGN aligned, so the chunk is too */
+    c->next = (char*)checked_malloc(chunk_size);
+    c->end = c->next + chunk_size - chunk_size % size;
+    stats.chunks++;
+  }
+  p = c->next;
+  c->next += size;
+  return p;
+}
+
+void* arena_realloc(void* ptr, size_t old_size, size_t size)
+{
+  void* p;
+  if (round_up(size) == round_up(old_size) && ptr)
+    return ptr;
+  p = arena_alloc(size);
+  if (ptr) {
+    memcpy(p, ptr, old_size < size ? old_size : size);
+    arena_free(ptr, old_size);
+  }
+  return p;
+}
+
+void arena_free(void* ptr, size_t size)
+{
+  size = round_up(size ? size : 1);
+  if (!ptr)
+    return;
+  if (enabled && size <= ARENA_MAX_SMALL) {
+    struct size_class* c = &classes[size / ARENA_ALIGN - 1];
+    *(void**)ptr = c->free;
+    c->free = ptr;
+    return;
+  }
+  stats.live -= size;
+  free(ptr);
+}
+
+unsigned long arena_requested()
+{
+  return stats.requested;
+}
@@ -0,0 +1,35 @@
+#ifndef ARENA_H
+#define ARENA_H
+
+#include <stddef.h>
+
+/*
+  Bump allocator for runtime objects.
+
+  Requests up to ARENA_MAX_SMALL bytes are rounded up to a multiple of
+  ARENA_ALIGN and bumped out of a chunk per size class, so objects of the
+  same kind end up next to each other. Larger requests go to malloc.
+  Freed small blocks are kept on a free list per size class and handed out
+  again before bumping.
+
+  Environment variables:
+    PYY_ARENA=0           use plain malloc for everything
+    PYY_ARENA_CHUNK=n     bytes per chunk (default 1 MiB)
+    PYY_ALLOC_STATS=1     print allocation counts and peak bytes at exit
+*/
+
+#define ARENA_ALIGN 8
+#define ARENA_MAX_SMALL 256
+
+void* arena_alloc(size_t size);
+
+/* Like realloc, old_size is the size ptr was allocated with */
+void* arena_realloc(void* ptr, size_t old_size, size_t size);
+
+/* Returns large allocations to malloc, small ones to their size class */
+void arena_free(void* ptr, size_t size);
+
+/* Bytes asked for so far, freed or not */
+unsigned long arena_requested();
+
+#endif /* ARENA_H */
@@ -0,0 +1,42 @@
+/*
+  Time to build many small lists, which is dominated by allocation.
+  Compare against plain malloc with PYY_ARENA=0.
+
+  Build and run from runtime/ with `make bench`.
+*/
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+#include "../runtime.h"
+
+static long now_ns()
+{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (long) ts.tv_sec * 1000000000 + (long) ts.tv_nsec;
+}
+
+static void bench(int n)
+{
+  int i, j;
+  long begin = now_ns();
+  pyobj last = 0;
+
+  for (i = 0; i != n; ++i) {
+    pyobj l = inject_big(create_list(inject_int(4)));
+    for (j = 0; j != 4; ++j)
+      set_subscript(l, inject_int(j), last);
+    last = l;
+  }
+
+  printf("%8d lists: %6.1f ns/list\n", n, (double) (now_ns() - begin) / n);
+}
+
+int main()
+{
+  bench(1000);
+  bench(100000);
+  bench(1000000);
+  return 0;
+}
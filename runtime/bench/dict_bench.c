@@ -0,0 +1,47 @@
+/*
+  Insert and lookup throughput of runtime dicts with int keys, through the
+  same entry points compiled programs use.
+
+  Build and run from runtime/ with `make bench`.
+*/
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+#include "../runtime.h"
+
+static long now_ns()
+{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (long) ts.tv_sec * 1000000000 + (long) ts.tv_nsec;
+}
+
+static void bench(int n)
+{
+  int i;
+  long begin, inserted, looked_up;
+  pyobj sum = 0;
+  pyobj d = inject_big(create_dict());
+
+  begin = now_ns();
+  for (i = 0; i != n; ++i)
+    set_subscript(d, inject_int(i * 7), inject_int(i));
+  inserted = now_ns();
+  for (i = 0; i != n; ++i)
+    sum += get_subscript(d, inject_int(i * 7));
+  looked_up = now_ns();
+
+  printf("%8d keys: insert %6.1f ns/op, lookup %6.1f ns/op (%ld)\n", n,
+         (double) (inserted - begin) / n,
+         (double) (looked_up - inserted) / n,
+         (long) project_int(sum));
+}
+
+int main()
+{
+  bench(1000);
+  bench(100000);
+  bench(1000000);
+  return 0;
+}
@@ -0,0 +1,65 @@
+/*
+  An allocation heavy loop: 1M short lived 4-element lists and a dict per 8
+  of them, with 64 lists and a 50-entry dict kept alive. Run once without
+  and once with PYY_GC=1, each in a child process so the environment is
+  read fresh. Allocation and collection stats go to stderr.
+
+  Build and run from runtime/ with `make bench`.
+*/
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/wait.h>
+
+#include "../runtime.h"
+
+#define N 1000000
+
+static long now_ns()
+{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (long) ts.tv_sec * 1000000000 + (long) ts.tv_nsec;
+}
+
+static void churn()
+{
+  pyobj ring[64] = {0};
+  pyobj kept = inject_big(create_dict());
+  long i, begin = now_ns();
+
+  for (i = 0; i != N; ++i) {
+    pyobj elems[4] = {inject_int(i), inject_int(i + 1), ring[(i + 1) & 63],
+                      inject_int(-i)};
+    pyobj l = create_list_from(4, elems);
+    /* only every 64th list keeps an older one alive */
+    ring[i & 63] = i % 64 ? create_list_from(2, elems) : l;
+    if (i % 8 == 0) {
+      pyobj d = inject_big(create_dict());
+      set_subscript(d, inject_int(0), l);
+      set_subscript(kept, inject_int(i % 50), d);
+    }
+  }
+  fprintf(stderr, "%-8s %6.1f ns/iteration\n", getenv("PYY_GC"),
+          (double) (now_ns() - begin) / N);
+}
+
+static void run(char* gc)
+{
+  if (fork() == 0) {
+    setenv("PYY_GC", gc, 1);
+    setenv("PYY_GC_STATS", gc, 1);
+    setenv("PYY_ALLOC_STATS", "1", 1);
+    churn();
+    exit(0);
+  }
+  wait(NULL);
+}
+
+int main()
+{
+  run("0");
+  run("1");
+  return 0;
+}
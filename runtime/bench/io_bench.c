@@ -0,0 +1,68 @@
+/*
+  Throughput of print_int_nl and input against printf/scanf, for 1M ints.
+  stdout and stdin are redirected to files, timings go to stderr.
+
+  Build and run from runtime/ with `make bench`.
+*/
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include <fcntl.h>
+#include <unistd.h>
+
+#include "../runtime.h"
+
+#define N 1000000
+#define TMP "/tmp/pyy_io_bench"
+
+static long now_ns()
+{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (long) ts.tv_sec * 1000000000 + (long) ts.tv_nsec;
+}
+
+static void redirect(int fd, int flags)
+{
+  int f = open(TMP, flags, 0600);
+  dup2(f, fd);
+  close(f);
+}
+
+int main()
+{
+  int i, x;
+  long begin, sum = 0;
+
+  redirect(1, O_WRONLY | O_CREAT | O_TRUNC);
+  begin = now_ns();
+  for (i = 0; i != N; ++i)
+    printf("%d\n", i * 79 - N);
+  fflush(stdout);
+  fprintf(stderr, "printf       %6.1f ns/int\n", (double) (now_ns() - begin) / N);
+
+  redirect(1, O_WRONLY | O_CREAT | O_TRUNC);
+  begin = now_ns();
+  for (i = 0; i != N; ++i)
+    print_int_nl(i * 79 - N);
+  io_flush();
+  fprintf(stderr, "print_int_nl %6.1f ns/int\n", (double) (now_ns() - begin) / N);
+
+  redirect(0, O_RDONLY);
+  begin = now_ns();
+  for (i = 0; i != N; ++i) {
+    scanf("%d", &x);
+    sum += x;
+  }
+  fprintf(stderr, "scanf        %6.1f ns/int (%ld)\n", (double) (now_ns() - begin) / N, sum);
+
+  redirect(0, O_RDONLY);
+  sum = 0;
+  begin = now_ns();
+  for (i = 0; i != N; ++i)
+    sum += input();
+  fprintf(stderr, "input        %6.1f ns/int (%ld)\n", (double) (now_ns() - begin) / N, sum);
+
+  unlink(TMP);
+  return 0;
+}
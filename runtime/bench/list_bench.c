@@ -0,0 +1,45 @@
+/*
+  Building a list one element at a time, as `l = l + [x]` compiles to:
+  with add, which copies both operands, and with add_inplace, which grows
+  the left operand geometrically. add is quadratic (and never frees), so
+  it is only run for small sizes.
+
+  Build and run from runtime/ with `make bench`.
+*/
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+#include "../runtime.h"
+
+static long now_ns()
+{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (long) ts.tv_sec * 1000000000 + (long) ts.tv_nsec;
+}
+
+static void bench(int n, big_pyobj* (*concat)(big_pyobj*, big_pyobj*), char* name)
+{
+  int i;
+  long begin = now_ns();
+  big_pyobj* l = create_list(inject_int(0));
+
+  for (i = 0; i != n; ++i) {
+    big_pyobj* x = create_list(inject_int(1));
+    x->u.l.data[0] = inject_int(i);
+    l = concat(l, x);
+  }
+
+  printf("%-11s %8d elements: %8.1f ns/element\n", name, n,
+         (double) (now_ns() - begin) / n);
+}
+
+int main()
+{
+  bench(1000, add, "add");
+  bench(10000, add, "add");
+  bench(100000, add_inplace, "add_inplace");
+  bench(1000000, add_inplace, "add_inplace");
+  return 0;
+}
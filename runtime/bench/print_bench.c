@@ -0,0 +1,48 @@
+/*
+  Printing dicts of n int entries with print_any. stdout is redirected to
+  /dev/null, timings go to stderr.
+
+  Build and run from runtime/ with `make bench`.
+*/
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include <fcntl.h>
+#include <unistd.h>
+
+#include "../runtime.h"
+
+static long now_ns()
+{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (long) ts.tv_sec * 1000000000 + (long) ts.tv_nsec;
+}
+
+static void bench(int n)
+{
+  int i;
+  long begin;
+  pyobj d = inject_big(create_dict_sized(n));
+
+  for (i = 0; i != n; ++i)
+    set_subscript(d, inject_int(i), inject_int(-i));
+
+  begin = now_ns();
+  print_any(d);
+  io_flush();
+  fprintf(stderr, "print_any %8d entries: %6.1f ns/entry\n", n,
+          (double) (now_ns() - begin) / n);
+}
+
+int main()
+{
+  int f = open("/dev/null", O_WRONLY);
+  dup2(f, 1);
+  close(f);
+
+  bench(10000);
+  bench(100000);
+  bench(1000000);
+  return 0;
+}
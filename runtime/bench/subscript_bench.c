@@ -0,0 +1,47 @@
+/*
+  Reading and writing a list with constant indices: with get_subscript and
+  set_subscript, which dispatch on the container and index tags and check
+  bounds, and with list_get_int and list_set_int, which the compiler calls
+  when it knows the index is in bounds.
+
+  Build and run from runtime/ with `make bench`.
+*/
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+#include "../runtime.h"
+
+#define LEN 8
+#define ROUNDS 10000000
+
+static long now_ns()
+{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (long) ts.tv_sec * 1000000000 + (long) ts.tv_nsec;
+}
+
+int main()
+{
+  int i;
+  long begin;
+  pyobj elems[LEN] = {0};
+  pyobj l = create_list_from(LEN, elems);
+  pyobj x = inject_int(1);
+
+  begin = now_ns();
+  for (i = 0; i != ROUNDS; ++i)
+    x = set_subscript(l, inject_int(i & (LEN - 1)),
+                      get_subscript(l, inject_int((i + 1) & (LEN - 1))) + x);
+  printf("%-24s %6.2f ns/round\n", "get/set_subscript",
+         (double) (now_ns() - begin) / ROUNDS);
+
+  begin = now_ns();
+  for (i = 0; i != ROUNDS; ++i)
+    x = list_set_int(l, i & (LEN - 1),
+                     list_get_int(l, (i + 1) & (LEN - 1)) + x);
+  printf("%-24s %6.2f ns/round\n", "list_get/set_int",
+         (double) (now_ns() - begin) / ROUNDS);
+  return x == 42;
+}
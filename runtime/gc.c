@@ -0,0 +1,288 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <setjmp.h>
+#include <time.h>
+
+#include "runtime.h"
+#include "gc.h"
+
+#if defined(__APPLE__)
+#include <pthread.h>
+#else
+/* top of the main thread's stack, set by glibc at startup */
+extern void* __libc_stack_end;
+#endif
+
+#define DEFAULT_THRESHOLD (4 << 20)
+
+/* the stack scan reads whole frames, including padding between locals */
+#if defined(__SANITIZE_ADDRESS__)
+#define NO_SANITIZE __attribute__((no_sanitize_address))
+#else
+#define NO_SANITIZE
+#endif
+
+static char initialized;
+static char enabled;
+static unsigned long threshold;
+static unsigned long next_collection; /* arena_requested() to collect at */
+
+/* Registered objects, mapped to their mark bit */
+static struct pydict* objects;
+
+/* Marked objects whose children are still to be marked */
+static big_pyobj** mark_stack;
+static unsigned int mark_len;
+static unsigned int mark_capacity;
+
+static struct {
+  unsigned long collections;
+  unsigned long freed;
+  unsigned long freed_bytes;
+  unsigned long live_bytes;  /* after the last collection */
+  long pause_ns;
+  long max_pause_ns;
+} stats;
+
+static unsigned int address_hash(pydict_key key)
+{
+  /* objects are ARENA_ALIGN aligned, spread them over the table */
+  return (unsigned int)((unsigned long)key / ARENA_ALIGN) * 2654435761u;
+}
+
+static int address_equal(pydict_key a, pydict_key b)
+{
+  return a == b;
+}
+
+static void print_stats()
+{
+  fprintf(stderr, "gc: %lu collections, %.3f ms paused (%.3f ms max)\n",
+          stats.collections, stats.pause_ns / 1e6, stats.max_pause_ns / 1e6);
+  fprintf(stderr, "gc: %lu objects (%lu bytes) freed, %lu bytes live "
+          "after the last collection\n",
+          stats.freed, stats.freed_bytes, stats.live_bytes);
+}
+
+static void init()
+{
+  char* env;
+  initialized = 1;
+  env = getenv("PYY_GC");
+  enabled = env && strcmp(env, "0") != 0;
+  env = getenv("PYY_GC_THRESHOLD");
+  threshold = env ? strtoul(env, NULL, 10) : DEFAULT_THRESHOLD;
+  next_collection = threshold;
+  objects = pydict_create(1024, address_hash, address_equal);
+  env = getenv("PYY_GC_STATS");
+  if (env && strcmp(env, "0") != 0)
+    atexit(print_stats);
+}
+
+static long now_ns()
+{
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (long) ts.tv_sec * 1000000000 + (long) ts.tv_nsec;
+}
+
+static int is_container(big_pyobj* b)
+{
+  return b->tag == LIST || b->tag == DICT;
+}
+
+/* Bytes held by b and the buffers only it points to */
+static unsigned long object_size(big_pyobj* b)
+{
+  unsigned long size = sizeof(big_pyobj);
+  if (b->tag == LIST)
+    size += sizeof(pyobj) * b->u.l.capacity;
+  else if (b->tag == DICT)
+    size += sizeof(struct pydict) +
+      sizeof(struct pydict_entry) * (b->u.d->mask + 1);
+  return size;
+}
+
+static void push(big_pyobj* b)
+{
+  if (mark_len == mark_capacity) {
+    mark_capacity = mark_capacity ? 2 * mark_capacity : 256;
+    mark_stack = (big_pyobj**)realloc(mark_stack, sizeof(big_pyobj*) * mark_capacity);
+    if (!mark_stack) {
+      printf("error, out of memory in gc\n");
+      exit(1);
+    }
+  }
+  mark_stack[mark_len++] = b;
+}
+
+static void mark(big_pyobj* b)
+{
+  pydict_value* marked = pydict_search(objects, (pydict_key)b);
+  if (marked && !*marked) {
+    *marked = 1;
+    push(b);
+  }
+}
+
+static void mark_value(pyobj v)
+{
+  if (tag(v) == BIG_TAG)
+    mark(project_big(v));
+}
+
+/* Marks a word that might point at or inside an object */
+static void mark_word(unsigned long w)
+{
+  unsigned long p = w & ~(unsigned long)(ARENA_ALIGN - 1);
+  unsigned long offset;
+  for (offset = 0; offset < sizeof(big_pyobj) && offset <= p; offset += ARENA_ALIGN)
+    mark((big_pyobj*)(p - offset));
+}
+
+static void mark_attrs(struct hashtable* attrs)
+{
+  struct hashtable_itr* itr;
+  if (hashtable_count(attrs) == 0)
+    return;
+  itr = hashtable_iterator(attrs);
+  do {
+    mark_value(*(pyobj*)hashtable_iterator_value(itr));
+  } while (hashtable_iterator_advance(itr));
+  free(itr);
+}
+
+static void mark_children(big_pyobj* b)
+{
+  switch (b->tag) {
+  case LIST: {
+    unsigned int i;
+    for (i = 0; i != b->u.l.len; ++i)
+      mark_value(b->u.l.data[i]);
+    break;
+  }
+  case DICT: {
+    unsigned int pos = 0;
+    pyobj k, v;
+    while (pydict_next(b->u.d, &pos, &k, &v)) {
+      mark_value(k);
+      mark_value(v);
+    }
+    break;
+  }
+  case FUN:
+    mark_value(b->u.f.free_vars);
+    break;
+  case CLASS:
+    mark_attrs(b->u.cl.attrs);
+    break;
+  case OBJECT:
+    mark_attrs(b->u.obj.attrs);
+    break;
+  case UBMETHOD:
+    mark_value(b->u.ubm.fun.free_vars);
+    break;
+  case BMETHOD:
+    mark_value(b->u.bm.fun.free_vars);
+    mark_attrs(b->u.bm.receiver.attrs);
+    break;
+  }
+}
+
+NO_SANITIZE static void mark_stack_words(void* from)
+{
+  unsigned long* p = (unsigned long*)from;
+  unsigned long* end;
+#if defined(__APPLE__)
+  end = (unsigned long*)pthread_get_stackaddr_np(pthread_self());
+#else
+  end = (unsigned long*)__libc_stack_end;
+#endif
+  for (; p < end; ++p)
+    mark_word(*p);
+}
+
+static void mark_roots(big_pyobj* keep)
+{
+  /* spills the callee-saved registers into regs, on the stack */
+  jmp_buf regs;
+  unsigned int pos = 0;
+  pydict_key k;
+  pydict_value v;
+
+  setjmp(regs);
+  mark_stack_words(&regs);
+  if (keep)
+    mark(keep);
+  while (pydict_next(objects, &pos, &k, &v))
+    if (!is_container((big_pyobj*)k))
+      mark((big_pyobj*)k);
+}
+
+static void free_object(big_pyobj* b)
+{
+  if (b->tag == LIST)
+    arena_free(b->u.l.data, sizeof(pyobj) * b->u.l.capacity);
+  else
+    pydict_destroy(b->u.d);
+  arena_free(b, sizeof(big_pyobj));
+}
+
+/* Frees unmarked objects, and registers the others unmarked in a new table */
+static void sweep()
+{
+  struct pydict* live = pydict_create(pydict_count(objects), address_hash,
+                                      address_equal);
+  unsigned int pos = 0;
+  pydict_key k;
+  pydict_value marked;
+
+  stats.live_bytes = 0;
+  while (pydict_next(objects, &pos, &k, &marked)) {
+    big_pyobj* b = (big_pyobj*)k;
+    if (marked) {
+      *pydict_slot(live, k, 0) = 0;
+      stats.live_bytes += object_size(b);
+    } else {
+      stats.freed++;
+      stats.freed_bytes += object_size(b);
+      free_object(b);
+    }
+  }
+  pydict_destroy(objects);
+  objects = live;
+}
+
+void gc_collect(big_pyobj* keep)
+{
+  long begin = now_ns();
+  long pause;
+
+  if (!initialized)
+    init();
+  mark_roots(keep);
+  while (mark_len)
+    mark_children(mark_stack[--mark_len]);
+  sweep();
+
+  next_collection = arena_requested() +
+    (threshold > stats.live_bytes ? threshold : stats.live_bytes);
+  pause = now_ns() - begin;
+  stats.collections++;
+  stats.pause_ns += pause;
+  if (pause > stats.max_pause_ns)
+    stats.max_pause_ns = pause;
+}
+
+big_pyobj* gc_track(big_pyobj* obj)
+{
+  if (!initialized)
+    init();
+  if (!enabled)
+    return obj;
+  *pydict_slot(objects, (pydict_key)obj, 0) = 0;
+  if (arena_requested() >= next_collection)
+    gc_collect(obj);
+  return obj;
+}
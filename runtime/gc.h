@@ -0,0 +1,33 @@
+#ifndef GC_H
+#define GC_H
+
+/*
+  Optional conservative mark and sweep collector for lists and dicts.
+
+  Every big_pyobj is registered with gc_track when it is created. Once
+  enough bytes were allocated since the last collection, gc_track marks
+  everything reachable from
+    - words on the stack and in callee-saved registers that look like a
+      (tagged, or pointing inside a) registered object, which covers the
+      -N(%ebp) slots and stack arrays of compiled code and the locals of
+      runtime functions further up the stack,
+    - every function, class, object and method, which are never freed,
+  through list elements, dict keys and values, attribute tables and free
+  variables, and returns unreachable lists and dicts to the arena.
+
+  Environment variables:
+    PYY_GC=1              enable collection (off by default)
+    PYY_GC_THRESHOLD=n    bytes allocated between collections (default
+                          4 MiB, at least the bytes live after the last one)
+    PYY_GC_STATS=1        print collection counts and pause times at exit
+*/
+
+struct pyobj_struct;
+
+/* Registers a new object, may collect first. Returns obj */
+struct pyobj_struct* gc_track(struct pyobj_struct* obj);
+
+/* Collects now, keeping keep (which may be NULL) alive */
+void gc_collect(struct pyobj_struct* keep);
+
+#endif /* GC_H */
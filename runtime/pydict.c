@@ -0,0 +1,119 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "pydict.h"
+
+/* Grow once more than 3/4 of the entries are used */
+#define PYDICT_FULL(d) (4 * ((d)->count + 1) > 3 * ((d)->mask + 1))
+
+static struct pydict_entry* alloc_entries(unsigned int size)
+{
+  struct pydict_entry* entries =
+    (struct pydict_entry*)calloc(size, sizeof(struct pydict_entry));
+  if (!entries) {
+    printf("error, out of memory in pydict\n");
+    exit(1);
+  }
+  return entries;
+}
+
+struct pydict* pydict_create(unsigned int minsize,
+                             unsigned int (*hashfn)(pydict_key),
+                             int (*eqfn)(pydict_key, pydict_key))
+{
+  unsigned int size = 8;
+  struct pydict* d = (struct pydict*)malloc(sizeof(struct pydict));
+  while (3 * size < 4 * minsize)
+    size <<= 1;
+  d->entries = alloc_entries(size);
+  d->mask = size - 1;
+  d->count = 0;
+  d->hashfn = hashfn;
+  d->eqfn = eqfn;
+  return d;
+}
+
+/* Index of the entry holding key, or of the empty entry it would go in */
+static unsigned int find(struct pydict* d, pydict_key key, unsigned int hash)
+{
+  unsigned int i = hash & d->mask;
+  struct pydict_entry* e;
+  for (;;) {
+    e = &d->entries[i];
+    if (!e->used)
+      return i;
+    if (e->hash == hash && (e->key == key || d->eqfn(e->key, key)))
+      return i;
+    i = (i + 1) & d->mask;
+  }
+}
+
+static void grow(struct pydict* d)
+{
+  struct pydict_entry* old = d->entries;
+  unsigned int old_size = d->mask + 1;
+  unsigned int i, j;
+
+  d->entries = alloc_entries(2 * old_size);
+  d->mask = 2 * old_size - 1;
+  for (i = 0; i != old_size; ++i) {
+    if (!old[i].used)
+      continue;
+    /* keys are distinct, so only the first free entry has to be found */
+    j = old[i].hash & d->mask;
+    while (d->entries[j].used)
+      j = (j + 1) & d->mask;
+    d->entries[j] = old[i];
+  }
+  free(old);
+}
+
+pydict_value* pydict_search(struct pydict* d, pydict_key key)
+{
+  struct pydict_entry* e = &d->entries[find(d, key, d->hashfn(key))];
+  return e->used ? &e->value : NULL;
+}
+
+pydict_value* pydict_slot(struct pydict* d, pydict_key key, pydict_value dflt)
+{
+  unsigned int hash = d->hashfn(key);
+  struct pydict_entry* e = &d->entries[find(d, key, hash)];
+  if (e->used)
+    return &e->value;
+  if (PYDICT_FULL(d)) {
+    grow(d);
+    e = &d->entries[find(d, key, hash)];
+  }
+  e->key = key;
+  e->value = dflt;
+  e->hash = hash;
+  e->used = 1;
+  d->count++;
+  return &e->value;
+}
+
+unsigned int pydict_count(struct pydict* d)
+{
+  return d->count;
+}
+
+int pydict_next(struct pydict* d, unsigned int* pos,
+                pydict_key* key, pydict_value* value)
+{
+  while (*pos <= d->mask) {
+    struct pydict_entry* e = &d->entries[(*pos)++];
+    if (e->used) {
+      *key = e->key;
+      *value = e->value;
+      return 1;
+    }
+  }
+  return 0;
+}
+
+void pydict_destroy(struct pydict* d)
+{
+  free(d->entries);
+  free(d);
+}
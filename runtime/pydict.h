@@ -0,0 +1,57 @@
+#ifndef PYDICT_H
+#define PYDICT_H
+
+/*
+  Open addressing hash table for python dicts.
+
+  Keys and values are stored inline in a power-of-two sized array of
+  entries and collisions are resolved with linear probing, so a lookup
+  is a mask and a scan over neighbouring entries instead of a modulo and
+  a chain of separately malloc'd nodes. Entries are never removed (python
+  programs we compile can't `del`), so no tombstones are needed.
+*/
+
+typedef long int pydict_key;
+typedef long int pydict_value;
+
+struct pydict_entry {
+  pydict_key key;
+  pydict_value value;
+  unsigned int hash;
+  unsigned int used;
+};
+
+struct pydict {
+  struct pydict_entry *entries;
+  unsigned int mask;   /* number of entries - 1 */
+  unsigned int count;  /* number of used entries */
+  unsigned int (*hashfn)(pydict_key);
+  int (*eqfn)(pydict_key, pydict_key);
+};
+
+/* Creates an empty table with room for at least minsize keys */
+struct pydict* pydict_create(unsigned int minsize,
+                             unsigned int (*hashfn)(pydict_key),
+                             int (*eqfn)(pydict_key, pydict_key));
+
+/* Returns a pointer to the value of key, or NULL if it is not in d */
+pydict_value* pydict_search(struct pydict* d, pydict_key key);
+
+/*
+  Returns a pointer to the value of key, inserting key with value dflt
+  first if it is not in d. The pointer is valid until the next insert.
+*/
+pydict_value* pydict_slot(struct pydict* d, pydict_key key, pydict_value dflt);
+
+unsigned int pydict_count(struct pydict* d);
+
+/*
+  Iterates over the entries of d: start with *pos = 0, each call stores the
+  next key and value and returns 1, or returns 0 once all were visited.
+*/
+int pydict_next(struct pydict* d, unsigned int* pos,
+                pydict_key* key, pydict_value* value);
+
+void pydict_destroy(struct pydict* d);
+
+#endif /* PYDICT_H */
@@ -0,0 +1,125 @@
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <errno.h>
+
+#include "pyio.h"
+
+#define OUT_SIZE (1 << 16)
+#define IN_SIZE (1 << 16)
+
+static char out_buf[OUT_SIZE];
+static size_t out_len;
+static char flush_at_exit;
+
+static char in_buf[IN_SIZE];
+static size_t in_pos;
+static size_t in_len;
+static char in_eof;
+
+static void write_all(const char* s, size_t len)
+{
+  while (len) {
+    ssize_t n = write(1, s, len);
+    if (n < 0) {
+      if (errno == EINTR)
+        continue;
+      return;
+    }
+    s += n;
+    len -= n;
+  }
+}
+
+void io_flush()
+{
+  write_all(out_buf, out_len);
+  out_len = 0;
+}
+
+/* Makes room for n more bytes in the buffer */
+static void reserve(size_t n)
+{
+  if (!flush_at_exit) {
+    flush_at_exit = 1;
+    atexit(io_flush);
+  }
+  if (out_len + n > OUT_SIZE)
+    io_flush();
+}
+
+void io_write(const char* s, size_t n)
+{
+  reserve(n);
+  if (n > OUT_SIZE) {
+    write_all(s, n);
+    return;
+  }
+  memcpy(out_buf + out_len, s, n);
+  out_len += n;
+}
+
+void io_putc(char c)
+{
+  reserve(1);
+  out_buf[out_len++] = c;
+}
+
+void io_puts(const char* s)
+{
+  io_write(s, strlen(s));
+}
+
+void io_write_int(long x)
+{
+  /* digits are produced backwards, from the end of tmp */
+  char tmp[24];
+  char* p = tmp + sizeof(tmp);
+  /* negative, so the most negative long doesn't overflow */
+  long neg = x < 0 ? x : -x;
+  do {
+    *--p = '0' - neg % 10;
+    neg /= 10;
+  } while (neg);
+  if (x < 0)
+    *--p = '-';
+  io_write(p, tmp + sizeof(tmp) - p);
+}
+
+/* Next input byte, or -1 at EOF */
+static int next_byte()
+{
+  if (in_pos == in_len) {
+    ssize_t n;
+    if (in_eof)
+      return -1;
+    do {
+      n = read(0, in_buf, IN_SIZE);
+    } while (n < 0 && errno == EINTR);
+    if (n <= 0) {
+      in_eof = 1;
+      return -1;
+    }
+    in_pos = 0;
+    in_len = n;
+  }
+  return (unsigned char) in_buf[in_pos++];
+}
+
+long io_read_int()
+{
+  long x = 0;
+  int neg = 0;
+  int c = next_byte();
+  while (c == ' ' || c == '\n' || c == '\t' || c == '\r')
+    c = next_byte();
+  if (c == '-' || c == '+') {
+    neg = c == '-';
+    c = next_byte();
+  }
+  while (c >= '0' && c <= '9') {
+    x = 10 * x + (c - '0');
+    c = next_byte();
+  }
+  return neg ? -x : x;
+}
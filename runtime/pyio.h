@@ -0,0 +1,24 @@
+#ifndef PYIO_H
+#define PYIO_H
+
+#include <stddef.h>
+
+/*
+  Buffered I/O on the raw stdin/stdout file descriptors, replacing a
+  printf/scanf call per value.
+
+  Output is collected in a large buffer, written when it fills up and at
+  exit. Code that still prints through stdio has to call io_flush before
+  and fflush(stdout) after, so the two streams stay in order.
+*/
+
+void io_write(const char* s, size_t n);
+void io_putc(char c);
+void io_puts(const char* s);
+void io_write_int(long x);
+void io_flush();
+
+/* Parses the next (optionally signed) decimal integer from stdin, 0 at EOF */
+long io_read_int();
+
+#endif /* PYIO_H */
@@ -41,7 +41,9 @@ long __timespec_diff(const struct timespec *end, const struct timespec *start) {
 void _print_nanotime_diff() {
   struct timespec ts2;
   clock_gettime(CLOCK_MONOTONIC, &ts2);
-  printf("nanoseconds: %ld\n", __timespec_diff(&ts2, &ts_begin));
+  io_puts("nanoseconds: ");
+  io_write_int(__timespec_diff(&ts2, &ts_begin));
+  io_putc('\n');
 }
 
 void _rand_seed_time() {
@@ -165,16 +167,17 @@ static int is_zero(pyobj val) {
 }
 
 static void print_int(int x) {
-  printf("%d", x);
+  io_write_int(x);
 }
 void print_int_nl(int x) {
-  printf("%d\n", x);
+  io_write_int(x);
+  io_putc('\n');
 }
 static void print_bool(int b) {
   if (b)
-    printf ("True");
+    io_puts("True");
   else
-    printf ("False");
+    io_puts("False");
 }
 
 static void print_pyobj(pyobj x) {
@@ -208,15 +211,11 @@ static void print_pyobj(pyobj x) {
 }
 
 int input() {
-  int i;
-  scanf("%d", &i);
-  return i;
+  return io_read_int();
 }
 
 pyobj input_int() {
-  int i;
-  scanf("%d", &i);
-  return inject_int(i);
+  return inject_int(io_read_int());
 }
 
 /*
@@ -224,33 +223,36 @@ pyobj input_int() {
 */
 
 static big_pyobj* list_to_big(list l) {
-  big_pyobj* v = (big_pyobj*)malloc(sizeof(big_pyobj));
+  big_pyobj* v = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
   v->tag = LIST;
+  v->hash_valid = 0;
+  v->printing = 0;
   v->u.l = l;
-  return v;
+  return gc_track(v);
 }
 
 big_pyobj* create_list(pyobj length) {
   list l;
   l.len = project_int(length); /* this should be checked */
-  l.data = (pyobj*)malloc(sizeof(pyobj) * l.len);
+  l.capacity = l.len;
+  l.data = (pyobj*)arena_alloc(sizeof(pyobj) * l.len);
   return list_to_big(l);
 }
 
+pyobj create_list_from(int n, pyobj* elems) {
+  list l;
+  l.len = n;
+  l.capacity = n;
+  l.data = (pyobj*)arena_alloc(sizeof(pyobj) * n);
+  memcpy(l.data, elems, sizeof(pyobj) * n);
+  return inject_big(list_to_big(l));
+}
+
 static pyobj make_list(pyobj length) {
   return inject_big(create_list(length));
 }
 
 
-static char is_in_list(list ls, pyobj b)
-{
-    int i;
-    for(i = 0; i < ls.len; i++)
-      if (ls.data[i] == b)
-	return 1;
-    return 0;
-}
-
 static int list_equal(list x, list y)
 {
   char eq = 1;
@@ -268,62 +270,33 @@ static int list_equal(list x, list y)
   Hashtable support
 */
 
-static char inside;
-static list printing_list;
-
+/*
+  A container that is being printed is marked, so printing it again from
+  inside itself prints {...} or [...], as python does.
+*/
 static void print_dict(pyobj dict)
 {
-    big_pyobj* d;
-    char inside_reset = 0;
-    if(!inside) {
-        inside = 1;
-        inside_reset = 1;
-        printing_list.len = 0;
-	printing_list.data = 0;
-    }
-    d = project_big(dict);
+  big_pyobj* d = project_big(dict);
+  unsigned int pos = 0;
+  int first = 1;
+  pyobj k, v;
 
-    if(is_in_list(printing_list, dict)) {
-        printf("{...}");
-        return;
-    }
-    printf("{");
-    int i = 0;
-    int max = hashtable_count(d->u.d);
-
-    struct hashtable_itr *itr = hashtable_iterator(d->u.d);
-    if (max) {
-        do {
-            pyobj k = *(pyobj *)hashtable_iterator_key(itr);
-            pyobj v = *(pyobj *)hashtable_iterator_value(itr);
-            print_pyobj(k);
-            printf(": ");
-            if (is_in_list(printing_list, v)
-		|| equal_pyobj(v,dict)) {
-	      printf("{...}");
-            }
-            else {
-                /* tally this dictionary in our list of printing dicts */
-	      list a;
-	      a.len = 1;
-	      a.data = (pyobj*)malloc(sizeof(pyobj) * a.len);
-	      a.data[0] = dict;
-	      /* Yuk, concatenating (adding) lists is slow! */
-	      printing_list = list_add(printing_list, a);
-	      print_pyobj(v);
-            }
-            if(i != max - 1)
-                printf(", ");
-            i++;
-        } while (hashtable_iterator_advance(itr));
-    }
-    printf("}");
-
-    if(inside_reset) {
-        inside = 0;
-        printing_list.len = 0;
-	printing_list.data = 0;
-    }
+  if (d->printing) {
+    io_puts("{...}");
+    return;
+  }
+  d->printing = 1;
+  io_putc('{');
+  while (pydict_next(d->u.d, &pos, &k, &v)) {
+    if (!first)
+      io_puts(", ");
+    first = 0;
+    print_pyobj(k);
+    io_puts(": ");
+    print_pyobj(v);
+  }
+  io_putc('}');
+  d->printing = 0;
 }
 
 
@@ -340,9 +313,8 @@ static int hash32shift(int key)
 }
 
 
-static unsigned int hash_any(void* o)
+static unsigned int hash_any(pyobj obj)
 {
-  pyobj obj = *(pyobj*)o;
   switch (tag(obj)) {
   case INT_TAG:
     return hash32shift(project_int(obj));
@@ -352,23 +324,32 @@ static unsigned int hash_any(void* o)
     return hash32shift(project_bool(obj));
   case BIG_TAG: {
     big_pyobj* b = project_big(obj);
+    char flat = 1;
+    if (b->hash_valid)
+      return b->hash;
     switch (b->tag) {
     case LIST: {
       int i;
       unsigned long h = 0; 
-      for (i = 0; i != b->u.l.len; ++i)
-	h = 5*h + hash_any(&b->u.l.data[i]);
+      for (i = 0; i != b->u.l.len; ++i) {
+	h = 5*h + hash_any(b->u.l.data[i]);
+	flat = flat && !is_big(b->u.l.data[i]);
+      }
+      b->hash = h;
+      b->hash_valid = flat;
       return h;
     }
     case DICT: {
-      struct hashtable_itr* i;
-      unsigned long h = 0; 
-      if (hashtable_count(b->u.d) == 0)
-	return h;
-      i = hashtable_iterator(b->u.d); 
-      do {
-	h = 5*h + hash_any(hashtable_iterator_value(i));
-      } while (hashtable_iterator_advance(i));
+      /* summed, since equal dicts may be laid out in different orders */
+      unsigned int pos = 0;
+      unsigned long h = 0;
+      pyobj k, v;
+      while (pydict_next(b->u.d, &pos, &k, &v)) {
+	h += 5*hash_any(k) + hash_any(v);
+	flat = flat && !is_big(k) && !is_big(v);
+      }
+      b->hash = h;
+      b->hash_valid = flat;
       return h;
     }
     default:
@@ -384,12 +365,12 @@ static unsigned int hash_any(void* o)
 }
 
 
-static struct hashtable *current_cmp_a;
-static struct hashtable *current_cmp_b;
+static dict current_cmp_a;
+static dict current_cmp_b;
 
-static char dict_equal(struct hashtable* x, struct hashtable* y)
+static char dict_equal(dict x, dict y)
 {
-    if(hashtable_count(x) != hashtable_count(y))
+    if(pydict_count(x) != pydict_count(y))
         return 0;
 
     if(current_cmp_a)
@@ -426,22 +407,14 @@ static char dict_equal(struct hashtable* x, struct hashtable* y)
         will_reset = 1;
     }
 
-    int max = hashtable_count(x);
-
-    struct hashtable_itr *itr_a = hashtable_iterator(x);
-    struct hashtable_itr *itr_b = hashtable_iterator(y);
-    if (max)
+    /* look every key of x up in y, entry order is not meaningful */
+    unsigned int pos = 0;
+    pyobj k, v;
+    while (same && pydict_next(x, &pos, &k, &v))
     {
-        do {
-            pyobj k_a = *(pyobj *)hashtable_iterator_key(itr_a);
-            pyobj v_a = *(pyobj *)hashtable_iterator_value(itr_a);
-            pyobj k_b = *(pyobj *)hashtable_iterator_key(itr_b);
-            pyobj v_b = *(pyobj *)hashtable_iterator_value(itr_b);
-
-            if(!equal_pyobj(k_a,k_b) || !equal_pyobj(v_a,v_b))
-                same = 0;
-
-        } while (hashtable_iterator_advance(itr_a) && hashtable_iterator_advance(itr_b));
+        pyobj* v_y = pydict_search(y, k);
+        if(!v_y || !equal_pyobj(v, *v_y))
+            same = 0;
     }
 
     if(will_reset)
@@ -453,6 +426,12 @@ static char dict_equal(struct hashtable* x, struct hashtable* y)
     return same;
 }
 
+/* Whether x and y both have a cached hash, and the hashes show they differ */
+static int hashes_differ(big_pyobj* x, big_pyobj* y)
+{
+  return x->hash_valid && y->hash_valid && x->hash != y->hash;
+}
+
 static int equal_pyobj(pyobj a, pyobj b)
 {
   switch (tag(a)) {
@@ -504,9 +483,9 @@ static int equal_pyobj(pyobj a, pyobj b)
       return 0;
     switch (x->tag) {
     case LIST:
-      return list_equal(x->u.l, y->u.l);
+      return !hashes_differ(x, y) && list_equal(x->u.l, y->u.l);
     case DICT:
-      return dict_equal(x->u.d, y->u.d);
+      return !hashes_differ(x, y) && dict_equal(x->u.d, y->u.d);
     case CLASS:
       return x == y;
     default:
@@ -519,34 +498,36 @@ static int equal_pyobj(pyobj a, pyobj b)
 }
 
 
-static int equal_any(void* a, void* b)
+big_pyobj* create_dict_sized(int n)
 {
-  return equal_pyobj(*(pyobj*)a, *(pyobj*)b);
+  big_pyobj* v = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
+  v->tag = DICT;
+  v->hash_valid = 0;
+  v->printing = 0;
+  v->u.d = pydict_create(n, hash_any, equal_pyobj);
+  return gc_track(v);
 }
 
 big_pyobj* create_dict()
 {
-  big_pyobj* v = (big_pyobj*)malloc(sizeof(big_pyobj));
-  v->tag = DICT;
-  v->u.d = create_hashtable(4, hash_any, equal_any);
-  return v;
+  return create_dict_sized(4);
+}
+
+pyobj dict_from_pairs(int n, pyobj* pairs)
+{
+  int i;
+  big_pyobj* v = create_dict_sized(n);
+  for (i = 0; i != n; ++i)
+    /* the last value wins for repeated keys */
+    *pydict_slot(v->u.d, pairs[2*i], pairs[2*i+1]) = pairs[2*i+1];
+  return inject_big(v);
 }
 
 static pyobj make_dict() { return inject_big(create_dict()); }
 
 static pyobj* dict_subscript(dict d, pyobj key)
 {
-  void* p = hashtable_search(d, &key);
-  if (p)
-    return (pyobj*)p;
-  else {
-    pyobj* k = (pyobj*) malloc(sizeof(pyobj));
-    *k = key;
-    pyobj* v = (pyobj*) malloc(sizeof(pyobj));
-    *v = inject_int(444);
-    hashtable_insert(d, k, v);
-    return v;
-  }
+  return pydict_slot(d, key, inject_int(444));
 }
 
 static pyobj* list_subscript(list ls, pyobj n)
@@ -598,7 +579,7 @@ static void print_float(double in)
         }
         else
         {
-            printf(printed_0_neg ? "-0.0" : "0.0");
+            io_puts(printed_0_neg ? "-0.0" : "0.0");
             return;
         }
     }
@@ -610,47 +591,38 @@ static void print_float(double in)
     while(*p && isdigit(*p))
         p++;
 
-    printf( ( (*p)  ? "%s" : "%s.0" ), outstr);
+    io_puts(outstr);
+    if (!*p)
+      io_puts(".0");
 }
 
-static pyobj *current_list;
 static void print_list(pyobj ls)
 {
-  big_pyobj* pyobj_list = project_big(ls);
-  if(current_list && current_list == pyobj_list->u.l.data) {
-    printf("[...]");
-    return;
-  }
+  big_pyobj* b = project_big(ls);
+  list l = b->u.l;
+  int i;
 
-  int will_reset = 0;
-  if(!current_list) {
-    current_list = pyobj_list->u.l.data;
-    will_reset = 1;
+  if (b->printing) {
+    io_puts("[...]");
+    return;
   }
-  
-  list l = pyobj_list->u.l;
-  printf("[");
-  int i;
-  for(i = 0; i < l.len; i++) {
-    if (tag(l.data[i]) == BIG_TAG && project_big((l.data[i]))->tag == LIST
-	&& project_big((l.data[i]))->u.l.data == l.data)
-      printf("[...]");
-    else
-      print_pyobj(l.data[i]);
-    if(i != l.len - 1)
-      printf(", ");
+  b->printing = 1;
+  io_putc('[');
+  for (i = 0; i < l.len; i++) {
+    if (i != 0)
+      io_puts(", ");
+    print_pyobj(l.data[i]);
   }
-  printf("]");
-  
-  if(will_reset)
-    current_list = NULL;
+  io_putc(']');
+  b->printing = 0;
 }
 
 static list list_add(list a, list b)
 {
   list c;
   c.len = a.len + b.len;
-  c.data = (pyobj*)malloc(sizeof(pyobj) * c.len);
+  c.capacity = c.len;
+  c.data = (pyobj*)arena_alloc(sizeof(pyobj) * c.len);
   int i;
   for (i = 0; i != a.len; ++i)
     c.data[i] = a.data[i];
@@ -659,6 +631,48 @@ static list list_add(list a, list b)
   return c;
 }
 
+/* Makes room for n elements, growing geometrically so appends are amortized O(1) */
+static void list_reserve(list* l, unsigned int n)
+{
+  unsigned int capacity = l->capacity;
+  if (n <= capacity)
+    return;
+  capacity = 2 * capacity > n ? 2 * capacity : n;
+  if (capacity < 4)
+    capacity = 4;
+  l->data = (pyobj*)arena_realloc(l->data, sizeof(pyobj) * l->capacity,
+                                  sizeof(pyobj) * capacity);
+  l->capacity = capacity;
+}
+
+big_pyobj* add_inplace(big_pyobj* a, big_pyobj* b) {
+  unsigned int i, len_a, len_b;
+  if (a->tag != LIST || b->tag != LIST) {
+    printf("error in add, expected a list\n");
+    exit(-1);
+  }
+  len_a = a->u.l.len;
+  len_b = b->u.l.len;
+  list_reserve(&a->u.l, len_a + len_b);
+  /* b->u.l.data is read after reserving, since b may be a */
+  for (i = 0; i != len_b; ++i)
+    a->u.l.data[len_a + i] = b->u.l.data[i];
+  a->u.l.len = len_a + len_b;
+  a->hash_valid = 0;
+  return a;
+}
+
+big_pyobj* list_append(big_pyobj* l, pyobj x) {
+  if (l->tag != LIST) {
+    printf("error in append, expected a list\n");
+    exit(-1);
+  }
+  list_reserve(&l->u.l, l->u.l.len + 1);
+  l->u.l.data[l->u.l.len++] = x;
+  l->hash_valid = 0;
+  return l;
+}
+
 big_pyobj* add(big_pyobj* a, big_pyobj* b) {
   switch (a->tag) {
   case LIST:
@@ -680,14 +694,14 @@ int equal(big_pyobj* a, big_pyobj* b) {
   case LIST:
     switch (b->tag) {
     case LIST:
-      return list_equal(a->u.l, b->u.l);
+      return !hashes_differ(a, b) && list_equal(a->u.l, b->u.l);
     default:
       return 0;
     }
   case DICT:
     switch (b->tag) {
     case DICT:
-      return dict_equal(a->u.d, b->u.d);
+      return !hashes_differ(a, b) && dict_equal(a->u.d, b->u.d);
     default:
       return 0;
     }
@@ -707,6 +721,7 @@ int not_equal(big_pyobj* x, big_pyobj* y) { return !equal(x, y); }
 
 static pyobj subscript_assign(big_pyobj* c, pyobj key, pyobj val)
 {
+  c->hash_valid = 0;
   switch (c->tag) {
   case LIST:
     return *list_subscript(c->u.l, key) = val;
@@ -737,8 +752,12 @@ static pyobj subscript(big_pyobj* c, pyobj key)
   switch (c->tag) {
   case LIST:
     return *list_subscript(c->u.l, key);
-  case DICT:
-    return *dict_subscript(c->u.d, key);
+  case DICT: {
+    /* a missing key reads as 444, but isn't inserted: the dict may be a key
+       itself, filed under its current hash */
+    pyobj* val = pydict_search(c->u.d, key);
+    return val ? *val : inject_int(444);
+  }
   default:
     printf("error in set subscript, not a list or dictionary\n");
     assert(0);
@@ -758,9 +777,21 @@ pyobj get_subscript(pyobj c, pyobj key)
   }
 }
 
+pyobj list_get_int(pyobj l, int i)
+{
+  return project_big(l)->u.l.data[i];
+}
+
+pyobj list_set_int(pyobj l, int i, pyobj val)
+{
+  big_pyobj* b = project_big(l);
+  b->hash_valid = 0;
+  return b->u.l.data[i] = val;
+}
+
 void print_any(pyobj p) {
   print_pyobj(p);
-  printf("\n");
+  io_putc('\n');
 }
 
 int is_true(pyobj v)
@@ -778,7 +809,7 @@ int is_true(pyobj v)
     case LIST:
       return b->u.l.len != 0;
     case DICT:
-      return hashtable_count(b->u.d) > 0;
+      return pydict_count(b->u.d) > 0;
     case FUN:
       return 1;
     case CLASS:
@@ -797,10 +828,10 @@ int is_true(pyobj v)
 /* Support for Functions */
 
 static big_pyobj* closure_to_big(function f) {
-  big_pyobj* v = (big_pyobj*)malloc(sizeof(big_pyobj));
+  big_pyobj* v = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
   v->tag = FUN;
   v->u.f = f;
-  return v;
+  return gc_track(v);
 }
 
 big_pyobj* create_closure(void* fun_ptr, pyobj free_vars) {
@@ -847,18 +878,75 @@ static int attrname_equal(void *a, void *b)
   return !strcmp( (char*)a, (char*)b );
 }
 
+/*
+  Attribute names are interned, so attribute tables hash and compare them
+  by address instead of walking the string at every lookup.
+*/
+static struct hashtable *interned_attrs;
+
+char* intern_attr(char* attr)
+{
+  char* sym;
+  if (!interned_attrs)
+    interned_attrs = create_hashtable(64, attrname_hash, attrname_equal);
+  sym = hashtable_search(interned_attrs, attr);
+  if (sym == NULL) {
+    sym = (char *)arena_alloc(strlen(attr)+1);
+    strcpy(sym, attr);
+    hashtable_insert(interned_attrs, sym, sym);
+  }
+  return sym;
+}
+
+static unsigned int attrsym_hash(void *sym)
+{
+  return (unsigned int)((unsigned long)sym >> 3);
+}
+
+static int attrsym_equal(void *a, void *b)
+{
+  return a == b;
+}
+
+/*
+  Per-class cache of attributes resolved through the class hierarchy,
+  direct mapped by name. Setting an attribute on any class can change
+  what its subclasses resolve to, so it bumps class_epoch, which empties
+  every cache on its next use.
+*/
+#define ATTR_CACHE_SIZE 16
+
+struct attr_cache {
+  unsigned int epoch;
+  struct {
+    char* sym;
+    pyobj* slot;
+  } entries[ATTR_CACHE_SIZE];
+};
+
+static unsigned int class_epoch = 1;
+
+static struct attr_cache* create_attr_cache()
+{
+  struct attr_cache* cache = (struct attr_cache*)arena_alloc(sizeof(struct attr_cache));
+  memset(cache, 0, sizeof(struct attr_cache));
+  return cache;
+}
+
 big_pyobj* create_class(pyobj bases)
 {
-  big_pyobj* ret = (big_pyobj*)malloc(sizeof(big_pyobj));
+  big_pyobj* ret = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
   ret->tag = CLASS;
-  ret->u.cl.attrs = create_hashtable(2, attrname_hash, attrname_equal);
+  ret->u.cl.attrs = create_hashtable(2, attrsym_hash, attrsym_equal);
+  ret->u.cl.cache = create_attr_cache();
+  ret->u.cl.self = ret;
 
   big_pyobj* basesp = project_big(bases);
   switch (basesp->tag) {
   case LIST: {
       int i;
       ret->u.cl.nparents = basesp->u.l.len;
-      ret->u.cl.parents = (class*)malloc(sizeof(class) * ret->u.cl.nparents);
+      ret->u.cl.parents = (class*)arena_alloc(sizeof(class) * ret->u.cl.nparents);
       for (i = 0; i != ret->u.cl.nparents; ++i) {
 	  pyobj* parent = &basesp->u.l.data[i];
 	  if (tag(*parent) == BIG_TAG && project_big(*parent)->tag == CLASS)
@@ -871,12 +959,12 @@ big_pyobj* create_class(pyobj bases)
   default:
     exit(-1);
   }
-  return ret;
+  return gc_track(ret);
 }
 
 /* we leave calling the __init__ function for a separate step. */
 big_pyobj* create_object(pyobj cl) {
-  big_pyobj* ret = (big_pyobj*)malloc(sizeof(big_pyobj));
+  big_pyobj* ret = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
   ret->tag = OBJECT;
   big_pyobj* clp = project_big(cl);
   if (clp->tag == CLASS)
@@ -885,8 +973,8 @@ big_pyobj* create_object(pyobj cl) {
     printf("in make object, expected a class\n");
     exit(-1);
   }
-  ret->u.obj.attrs = create_hashtable(2, attrname_hash, attrname_equal);
-  return ret;
+  ret->u.obj.attrs = create_hashtable(2, attrsym_hash, attrsym_equal);
+  return gc_track(ret);
 }
 
 static pyobj* attrsearch_rec(class cl, char* attr) {
@@ -905,8 +993,45 @@ static pyobj* attrsearch_rec(class cl, char* attr) {
         return ptr;
 }
 
-static pyobj* attrsearch(class cl, char* attr) {
-    pyobj* ret = attrsearch_rec(cl, attr);
+/* attrsearch_rec through the per-class cache, attr has to be interned */
+static pyobj* class_lookup(class cl, char* attr) {
+    struct attr_cache* cache = cl.cache;
+    unsigned int i = attrsym_hash(attr) % ATTR_CACHE_SIZE;
+    pyobj* slot;
+
+    if (cache->epoch != class_epoch) {
+        memset(cache, 0, sizeof(struct attr_cache));
+        cache->epoch = class_epoch;
+    }
+    if (cache->entries[i].sym == attr)
+        return cache->entries[i].slot;
+
+    slot = attrsearch_rec(cl, attr);
+    if (slot != NULL) {
+        cache->entries[i].sym = attr;
+        cache->entries[i].slot = slot;
+    }
+    return slot;
+}
+
+/* class_lookup, skipped while site last resolved attr for the same class */
+static pyobj* site_lookup(class cl, char* attr, struct attr_site* site) {
+    pyobj* slot;
+    if (site == NULL)
+        return class_lookup(cl, attr);
+    if (site->cls == cl.attrs && site->epoch == class_epoch)
+        return site->slot;
+    slot = class_lookup(cl, attr);
+    if (slot != NULL) {
+        site->cls = cl.attrs;
+        site->epoch = class_epoch;
+        site->slot = slot;
+    }
+    return slot;
+}
+
+static pyobj* attrsearch(class cl, char* attr, struct attr_site* site) {
+    pyobj* ret = site_lookup(cl, attr, site);
     if (ret == NULL) {
         printf("attribute %s not found\n", attr);
         exit(-1);
@@ -914,35 +1039,44 @@ static pyobj* attrsearch(class cl, char* attr) {
     return ret;
 }
 
+static char* site_attr(struct attr_site* site) {
+    if (!site->interned) {
+        site->name = intern_attr(site->name);
+        site->interned = 1;
+    }
+    return site->name;
+}
+
 static big_pyobj* create_bound_method(object receiver, function f) {
-  big_pyobj* ret = (big_pyobj*)malloc(sizeof(big_pyobj));
+  big_pyobj* ret = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
   ret->tag = BMETHOD;
   ret->u.bm.fun = f;
   ret->u.bm.receiver = receiver;
-  return ret;
+  return gc_track(ret);
 }
 
 static big_pyobj* create_unbound_method(class cl, function f) {
-  big_pyobj* ret = (big_pyobj*)malloc(sizeof(big_pyobj));
+  big_pyobj* ret = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
   ret->tag = UBMETHOD;
   ret->u.ubm.fun = f;
   ret->u.ubm.cl = cl;
-  return ret;
+  return gc_track(ret);
 }
 
-int has_attr(pyobj o, char* attr)
+/* attr has to be interned, site may be NULL */
+static int has_attr_sym(pyobj o, char* attr, struct attr_site* site)
 {
   if (tag(o) == BIG_TAG) {
     big_pyobj* b = project_big(o);
     switch (b->tag) {
     case CLASS: {
-      pyobj* attribute = attrsearch_rec(b->u.cl, attr);
+      pyobj* attribute = site_lookup(b->u.cl, attr, site);
       return attribute != NULL;
     }
     case OBJECT: {
       pyobj* attribute = hashtable_search(b->u.obj.attrs, attr);
       if (attribute == NULL) {
-        attribute = attrsearch_rec(b->u.cl, attr);
+        attribute = site_lookup(b->u.obj.cl, attr, site);
         return attribute != NULL;
       } else {
         return 1;
@@ -955,6 +1089,16 @@ int has_attr(pyobj o, char* attr)
     return 0;
 }
 
+int has_attr(pyobj o, char* attr)
+{
+  return has_attr_sym(o, intern_attr(attr), NULL);
+}
+
+int has_attr_site(pyobj o, struct attr_site* site)
+{
+  return has_attr_sym(o, site_attr(site), site);
+}
+
 static int inherits_rec(class c1, class c2) {
   int ret = 0;
   if (c1.attrs == c2.attrs) {
@@ -976,27 +1120,21 @@ int inherits(pyobj c1, pyobj c2) {
 
 big_pyobj* get_class(pyobj o)
 {
-  big_pyobj* ret = (big_pyobj*)malloc(sizeof(big_pyobj));
-  ret->tag = CLASS;
-
   big_pyobj* b = project_big(o);
   switch (b->tag) {
   case OBJECT:
-    ret->u.cl = b->u.obj.cl;
-    break;
+    return b->u.obj.cl.self;
   case UBMETHOD:
-    ret->u.cl = b->u.ubm.cl;
-    break;
+    return b->u.ubm.cl.self;
   default:
     printf("get_class expected object or unbound method\n");
     exit(-1);
   }
-  return ret;
 }
 
 big_pyobj* get_receiver(pyobj o)
 {
-  big_pyobj* ret = (big_pyobj*)malloc(sizeof(big_pyobj));
+  big_pyobj* ret = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
   ret->tag = OBJECT;
   big_pyobj* b = project_big(o);
   switch (b->tag) {
@@ -1007,12 +1145,12 @@ big_pyobj* get_receiver(pyobj o)
     printf("get_receiver expected bound method\n");
     exit(-1);
   }
-  return ret;
+  return gc_track(ret);
 }
 
 big_pyobj* get_function(pyobj o)
 {
-  big_pyobj* ret = (big_pyobj*)malloc(sizeof(big_pyobj));
+  big_pyobj* ret = (big_pyobj*)arena_alloc(sizeof(big_pyobj));
   ret->tag = FUN;
   big_pyobj* b = project_big(o);
   switch (b->tag) {
@@ -1026,15 +1164,16 @@ big_pyobj* get_function(pyobj o)
     printf("get_function expected a method\n");
     exit(-1);
   }
-  return ret;
+  return gc_track(ret);
 }
 
-pyobj get_attr(pyobj c, char* attr)
+/* attr has to be interned, site may be NULL */
+static pyobj get_attr_sym(pyobj c, char* attr, struct attr_site* site)
 {
   big_pyobj* b = project_big(c);
   switch (b->tag) {
   case CLASS: {
-    pyobj* attribute = attrsearch(b->u.cl, attr);
+    pyobj* attribute = attrsearch(b->u.cl, attr, site);
     if (is_function(*attribute)) {
       return inject_big(create_unbound_method(b->u.cl, project_function(*attribute)));
     } else {
@@ -1044,7 +1183,7 @@ pyobj get_attr(pyobj c, char* attr)
   case OBJECT: {
     pyobj* attribute = hashtable_search(b->u.obj.attrs, attr);
     if (attribute == NULL) {
-        attribute = attrsearch(b->u.obj.cl, attr);
+        attribute = attrsearch(b->u.obj.cl, attr, site);
         if (is_function(*attribute)) {
           return inject_big(create_bound_method(b->u.obj, project_function(*attribute)));
         } else {
@@ -1060,15 +1199,20 @@ pyobj get_attr(pyobj c, char* attr)
   }
 }
 
+pyobj get_attr(pyobj c, char* attr)
+{
+  return get_attr_sym(c, intern_attr(attr), NULL);
+}
+
+pyobj get_attr_site(pyobj c, struct attr_site* site)
+{
+  return get_attr_sym(c, site_attr(site), site);
+}
+
 pyobj set_attr(pyobj obj, char* attr, pyobj val)
 {
-    char* k;
+    char* k = intern_attr(attr);
     pyobj* v;
-    k = (char *)malloc(strlen(attr)+1);
-    v = (pyobj *)malloc(sizeof(pyobj));
-    strcpy(k, attr);
-    *v = val;
-    
     struct hashtable* attrs;
     
     big_pyobj* b = project_big(obj);
@@ -1084,11 +1228,21 @@ pyobj set_attr(pyobj obj, char* attr, pyobj val)
       exit(-1);
     }
 
-    if(!hashtable_change(attrs, k, v))
-        if(!hashtable_insert(attrs, k, v)) {
-           printf("out of memory");
-           exit(-1);
-        }
+    /* updated in place, so cached slots stay valid */
+    v = hashtable_search(attrs, k);
+    if (v != NULL) {
+        *v = val;
+        return val;
+    }
+    if (b->tag == CLASS)
+      /* a new class attribute may shadow one of a parent class */
+      class_epoch++;
+    v = (pyobj *)arena_alloc(sizeof(pyobj));
+    *v = val;
+    if(!hashtable_insert(attrs, k, v)) {
+        printf("out of memory");
+        exit(-1);
+    }
     return val;
 }
 
@@ -1096,3 +1250,33 @@ pyobj error_pyobj(char* string) {
   printf(string);
   exit(-1);
 }
+
+#if defined(__i386__)
+void REGPARM print_int_nl_rp(int x) {
+  print_int_nl(x);
+}
+
+pyobj REGPARM create_list_from_rp(int n, pyobj* elems) {
+  return create_list_from(n, elems);
+}
+
+pyobj REGPARM dict_from_pairs_rp(int n, pyobj* pairs) {
+  return dict_from_pairs(n, pairs);
+}
+
+pyobj REGPARM set_subscript_rp(pyobj c, pyobj key, pyobj val) {
+  return set_subscript(c, key, val);
+}
+
+pyobj REGPARM get_subscript_rp(pyobj c, pyobj key) {
+  return get_subscript(c, key);
+}
+
+pyobj REGPARM list_get_int_rp(pyobj l, int i) {
+  return list_get_int(l, i);
+}
+
+pyobj REGPARM list_set_int_rp(pyobj l, int i, pyobj val) {
+  return list_set_int(l, i, val);
+}
+#endif
@@ -4,6 +4,10 @@
 #include "hashtable.h"
 #include "hashtable_itr.h"
 #include "hashtable_utility.h"
+#include "pydict.h"
+#include "arena.h"
+#include "pyio.h"
+#include "gc.h"
 
 /* NEW STUFF */
 void _nanotime_begin();
@@ -43,10 +47,11 @@ struct pyobj_struct;
 struct list_struct {
   pyobj* data;
   unsigned int len;
+  unsigned int capacity; /* elements data has room for */
 };
 typedef struct list_struct list;
 
-typedef struct hashtable* dict;
+typedef struct pydict* dict;
 
 struct fun_struct {
   void* function_ptr;
@@ -54,10 +59,14 @@ struct fun_struct {
 };
 typedef struct fun_struct function;
 
+struct attr_cache;
+
 struct class_struct {
-  struct hashtable *attrs;
+  struct hashtable *attrs; /* keyed by interned names */
   int nparents;
   struct class_struct *parents;
+  struct attr_cache *cache; /* attributes resolved through the hierarchy */
+  struct pyobj_struct *self; /* the big_pyobj this class was created as */
 };
 typedef struct class_struct class;
 
@@ -82,6 +91,12 @@ typedef struct bound_method_struct bound_method;
 
 struct pyobj_struct {
   enum big_type_tag tag;
+  /* hash of a list or dict, cached while hash_valid is set. Only cached for
+     containers without big elements, which can change behind our back */
+  unsigned int hash;
+  char hash_valid;
+  /* set while the container is printed, to print cycles as {...} / [...] */
+  char printing;
   union {
     dict d;
     list l;
@@ -120,11 +135,23 @@ void print_any(pyobj p);
 pyobj input_int();
 
 big_pyobj* create_list(pyobj length);
+/* The list [elems[0], ..., elems[n-1]] */
+pyobj create_list_from(int n, pyobj* elems);
 big_pyobj* create_dict();
+/* An empty dict with room for n keys */
+big_pyobj* create_dict_sized(int n);
+/* The dict {pairs[0]: pairs[1], ..., pairs[2n-2]: pairs[2n-1]} */
+pyobj dict_from_pairs(int n, pyobj* pairs);
 pyobj set_subscript(pyobj c, pyobj key, pyobj val);
 pyobj get_subscript(pyobj c, pyobj key);
+/* l[i] for a list l with 0 <= i < len(l), checked by the compiler */
+pyobj list_get_int(pyobj l, int i);
+pyobj list_set_int(pyobj l, int i, pyobj val);
 
 big_pyobj* add(big_pyobj* a, big_pyobj* b);
+/* a + b stored into a, for when a is not referenced anywhere else */
+big_pyobj* add_inplace(big_pyobj* a, big_pyobj* b);
+big_pyobj* list_append(big_pyobj* l, pyobj x);
 int equal(big_pyobj* a, big_pyobj* b);
 int not_equal(big_pyobj* x, big_pyobj* y);
 
@@ -143,6 +170,42 @@ int has_attr(pyobj o, char* attr);
 pyobj get_attr(pyobj c, char* attr);
 pyobj set_attr(pyobj obj, char* attr, pyobj val);
 
+/* Returns the canonical copy of an attribute name, which can be compared
+   and hashed by address */
+char* intern_attr(char* attr);
+
+/*
+  Monomorphic inline cache for one attribute access in the program, which
+  remembers where the attribute was found for the last class seen. Emit one
+  zero initialized site per access with name pointing at the attribute name.
+*/
+struct attr_site {
+  char* name;              /* interned on first use */
+  char interned;
+  struct hashtable* cls;   /* attrs of the class the slot was resolved for */
+  unsigned int epoch;
+  pyobj* slot;
+};
+int has_attr_site(pyobj o, struct attr_site* site);
+pyobj get_attr_site(pyobj c, struct attr_site* site);
+
 pyobj error_pyobj(char* string);
 
+/*
+  regparm(3) variants of the hot entry points, called by compiled i386 code
+  with the first three args in %eax, %edx and %ecx instead of on the stack.
+  They behave like the cdecl functions of the same name without _rp.
+*/
+#if defined(__i386__)
+#define REGPARM __attribute__((regparm(3)))
+
+void print_int_nl_rp(int x) REGPARM;
+pyobj create_list_from_rp(int n, pyobj* elems) REGPARM;
+pyobj dict_from_pairs_rp(int n, pyobj* pairs) REGPARM;
+pyobj set_subscript_rp(pyobj c, pyobj key, pyobj val) REGPARM;
+pyobj get_subscript_rp(pyobj c, pyobj key) REGPARM;
+pyobj list_get_int_rp(pyobj l, int i) REGPARM;
+pyobj list_set_int_rp(pyobj l, int i, pyobj val) REGPARM;
+#endif
+
 #endif /* RUNTIME_H */
@@ -0,0 +1,86 @@
+from instructions import *
+
+
+_INVERSE = {cmove: cmovne, cmovne: cmove}
+
+
+def schedule_merges(x86IR, locations, regs):
+    # type: ([x86instruction], {str: str}, [str]) -> [x86instruction]
+    """
+    Runs after allocation, on the merges cmov selects are lowered to,
+        movl else, %ecx; cmovne then, %ecx; movl %ecx, x
+    which all go through %ecx, so each one waits for the one before it.
+    A merge into a register selects in place instead. The other merges of a
+    run get a scratch register each, out of %ecx and the regs free over the
+    run, and are reordered into all loads, then all cmovs, then all stores.
+    """
+    res = []
+    i = 0
+    while i < len(x86IR):
+        instr = x86IR[i]
+        if isinstance(instr, if_instr):
+            instr.then_ = schedule_merges(instr.then_, locations, regs)
+            instr.else_ = schedule_merges(instr.else_, locations, regs)
+        elif isinstance(instr, while_instr):
+            instr.test_instrs = schedule_merges(instr.test_instrs, locations, regs)
+            instr.body = schedule_merges(instr.body, locations, regs)
+        run = []
+        while _is_merge(x86IR[i + 3 * len(run):i + 3 * len(run) + 3]):
+            run.append(x86IR[i + 3 * len(run):i + 3 * len(run) + 3])
+        if run:
+            res += _schedule_run(run, locations, regs)
+            i += 3 * len(run)
+        else:
+            res.append(instr)
+            i += 1
+    return res
+
+
+def _is_merge(instrs):
+    # type: ([x86instruction]) -> bool
+    if len(instrs) < 3:
+        return False
+    load, select, store = instrs
+    return type(load) is movl and load.vars[1] == "%ecx" and \
+        type(select) in _INVERSE and select.vars[1] == "%ecx" and \
+        type(store) is movl and store.vars[0] == "%ecx" and \
+        store.var_locations[1] != "%ecx"
+
+
+def _schedule_run(run, locations, regs):
+    # type: ([[x86instruction]], {str: str}, [str]) -> [x86instruction]
+    # Moving the reads of later merges up and the stores of earlier ones
+    # down is safe: a value read after a store interferes with what is
+    # stored, so they are never in the same place.
+    busy = set()
+    for instr in sum(run, []):
+        busy |= set(locations.get(v, v) for v in instr.live_vars_after)
+        busy |= set(instr.var_locations)
+    pool = ["%ecx"] + [r for r in regs if r not in busy]
+
+    res = []
+    loads, selects, stores = [], [], []
+    for load, select, store in run:
+        else_, then_, x = load.vars[0], select.vars[0], store.vars[1]
+        else_loc, then_loc = load.var_locations[0], select.var_locations[0]
+        x_loc = store.var_locations[1]
+        if x_loc.startswith("%"):
+            if x_loc == else_loc:
+                selects.append(type(select)(then_, x))
+            elif x_loc == then_loc:
+                selects.append(_INVERSE[type(select)](else_, x))
+            else:
+                selects += [movl(else_, x), type(select)(then_, x)]
+            continue
+        if len(loads) == len(pool):
+            res += loads + selects + stores
+            loads, selects, stores = [], [], []
+        reg = pool[len(loads)]
+        loads.append(movl(else_, reg))
+        selects.append(type(select)(then_, reg))
+        stores.append(movl(reg, x))
+    res += loads + selects + stores
+
+    for instr in res:
+        instr.assign_locations(locations)
+    return res
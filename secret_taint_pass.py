@@ -0,0 +1,131 @@
+from instructions import *
+from compiler.ast import Name
+
+
+# Calls whose results are treated as secret.
+SECRET_SOURCES = {
+    "input",
+    "_rand_zero_or_one",
+}
+
+# Calls that consume their arguments without storing them anywhere.
+OUTPUT_SINKS = {
+    "print_int_nl",
+}
+
+# Pseudo names for taint that lives outside of variables
+_FLAGS = "flags"
+_ARGS = "args"
+
+
+class _Heap:
+    def __init__(self):
+        # set once a secret has been handed to the runtime, since it could
+        # have been stored in a list or a dict
+        self.secret = False
+        self.changed = False
+
+
+def mark_secret_branches(x86IR):
+    # type: ([x86instruction]) -> ()
+    """
+    Sets `secret` on every `if_instr` and `while_instr` to whether its test
+    may depend on a secret, or it is nested in a branch on a secret (executing
+    it at all would then reveal which way the outer branch went). Public
+    branches compile to plain jumps.
+
+    Secrets come from calls in `SECRET_SOURCES`, and are tracked flow
+    sensitively, so temporaries reused by the flattener don't stay tainted.
+    """
+    heap = _Heap()
+    heap.changed = True
+    while heap.changed:
+        heap.changed = False
+        _reset(x86IR)
+        _walk(x86IR, False, set(), heap)
+
+
+def _reset(instrs):
+    for instr in instrs:
+        if isinstance(instr, if_instr):
+            instr.secret = False
+            _reset(instr.then_)
+            _reset(instr.else_)
+        elif isinstance(instr, while_instr):
+            instr.secret = False
+            _reset(instr.test_instrs)
+            _reset(instr.body)
+
+
+def _reads_secret(names, tainted):
+    return any(name in tainted for name in names)
+
+
+def _walk(instrs, secret_pc, tainted, heap):
+    # type: ([x86instruction], bool, {str}, _Heap) -> {str}
+    """
+    Returns the names (variables, registers and pseudo names) that may hold
+    a secret after running `instrs` with `tainted` secret before.
+    """
+    for instr in instrs:
+        if isinstance(instr, if_instr):
+            test_secret = secret_pc or _reads_secret(instr.vars_names(), tainted)
+            instr.secret = instr.secret or test_secret
+            tainted_then = _walk(instr.then_, test_secret, set(tainted), heap)
+            tainted_else = _walk(instr.else_, test_secret, set(tainted), heap)
+            tainted = tainted_then | tainted_else
+            continue
+
+        elif isinstance(instr, while_instr):
+            loop_secret = secret_pc
+            tainted_in = set(tainted)
+            while True:
+                tainted = _walk(instr.test_instrs, loop_secret, set(tainted_in), heap)
+                loop_secret = loop_secret or _reads_secret(instr.vars_names(), tainted)
+                tainted_body = _walk(instr.body, loop_secret, set(tainted), heap)
+                if tainted_body <= tainted_in:
+                    break
+                tainted_in |= tainted_body
+            instr.secret = instr.secret or loop_secret
+            continue
+
+        reads_secret = secret_pc or _reads_secret(instr.vars_read(), tainted)
+
+        if isinstance(instr, pad_args):
+            tainted.discard(_ARGS)
+            continue
+        elif isinstance(instr, pushl):
+            if reads_secret:
+                tainted.add(_ARGS)
+            continue
+        elif isinstance(instr, call):
+            # args are pushed, or moved into the `abi.call_regs` the call
+            # reads (on x86_64, and for regparm calls on i386)
+            args_secret = _ARGS in tainted or \
+                _reads_secret(instr.vars_read(), tainted)
+            if args_secret and instr.func not in OUTPUT_SINKS and not heap.secret:
+                heap.secret = True
+                heap.changed = True
+            reads_secret = reads_secret or args_secret or heap.secret \
+                or instr.func in SECRET_SOURCES
+        elif isinstance(instr, cmpl):
+            _set(tainted, _FLAGS, reads_secret)
+        elif isinstance(instr, sete_cl) or isinstance(instr, setne_cl):
+            reads_secret = reads_secret or _FLAGS in tainted
+        elif isinstance(instr, movzbl_cl):
+            reads_secret = reads_secret or "%ecx" in tainted
+        elif isinstance(instr, cmove) or isinstance(instr, cmovne):
+            reads_secret = reads_secret or _FLAGS in tainted
+            # the destination keeps its old value if the move doesn't happen
+            reads_secret = reads_secret or _reads_secret(instr.vars_written(), tainted)
+
+        for name in instr.vars_written():
+            _set(tainted, name, reads_secret)
+    return tainted
+
+
+def _set(tainted, name, secret):
+    if secret:
+        tainted.add(name)
+    else:
+        tainted.discard(name)
@@ -0,0 +1,291 @@
+from instructions import *
+from compiler.ast import Name, Const
+from liveness import live_before, live_at_loop_head
+
+
+# Instructions whose destination is read too, without it being in vars_read
+_READS_TARGET = (cmove, cmovne)
+
+
+class _Versions:
+    """
+    Hands out the SSA names of a compilation, `x#1`, `x#2`, ... for `x`.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def new(self, name):
+        # type: (str) -> Name
+        self.count += 1
+        return Name("%s#%d" % (name, self.count))
+
+
+def to_ssa(x86IR, predicated=False):
+    # type: ([x86instruction], bool) -> [x86instruction]
+    """
+    Renames every write of a name to a fresh version, so each version is
+    written once, outside of loops. Where control flow joins, a version is
+    chosen for each name live there (a phi), lowered to
+    - a cmov select (or and/or masks if `predicated`) after secret ifs, whose
+      branches both run, in order, as straight line code,
+    - copies at the end of both branches of public ifs,
+    - a copy before a while loop and at the end of its body, into the version
+      the loop test and body start with.
+    Since versions are never overwritten, secret branches need neither
+    renamed copies of what they write, nor a saved test, and nested secret
+    ifs don't have to combine their test with the outer ones.
+    """
+    return _convert(x86IR, dict(), set(), _Versions(), predicated)
+
+
+def definition_order(x86IR, order=None):
+    # type: ([x86instruction], [str]) -> [str]
+    """
+    Names in the order they are first written in. On SSA code this is a
+    perfect elimination order of the interference graph, reversed.
+    """
+    if order is None:
+        order = []
+    for instr in x86IR:
+        if isinstance(instr, if_instr):
+            definition_order(instr.then_, order)
+            definition_order(instr.else_, order)
+        elif isinstance(instr, while_instr):
+            definition_order(instr.test_instrs, order)
+            definition_order(instr.body, order)
+        else:
+            order += [v for v in instr.vars_written() if v[0] != "%"]
+    return order
+
+
+def _live_afters(instrs, live_after):
+    # type: ([x86instruction], {str}) -> [{str}]
+    lives = []
+    live = set(live_after)
+    for instr in reversed(instrs):
+        lives.append(live)
+        live = live_before([instr], live)
+    lives.reverse()
+    return lives
+
+
+def _rename(instr, renamings):
+    # type: (x86instruction, {str: Name}) -> ()
+    instr.vars = [renamings.get(v.name, v) if isinstance(v, Name) else v
+                  for v in instr.vars]
+
+
+def _convert(instrs, cur, live_after, versions, predicated):
+    # type: ([x86instruction], {str: Name}, {str}, _Versions, bool) -> [x86instruction]
+    """
+    Converts instrs, given the current version of each name in cur, which is
+    updated to the versions live after them.
+    """
+    res = []
+    for instr, live in zip(instrs, _live_afters(instrs, live_after)):
+        if isinstance(instr, if_instr):
+            res += _convert_if(instr, cur, live, versions, predicated)
+        elif isinstance(instr, while_instr):
+            res += _convert_while(instr, cur, live, versions, predicated)
+        else:
+            res += _convert_instr(instr, cur, versions)
+    return res
+
+
+def _convert_instr(instr, cur, versions):
+    # type: (x86instruction, {str: Name}, _Versions) -> [x86instruction]
+    res = []
+    written = [v for v in instr.vars_written() if v[0] != "%"]
+    read = set(instr.vars_read())
+    renamings = dict(cur)
+    for name in written:
+        new = versions.new(name)
+        if name in read or isinstance(instr, _READS_TARGET):
+            # the new version starts out as the old one, and is updated
+            res.append(movl(cur.get(name, Name(name)), new))
+        renamings[name] = new
+        cur[name] = new
+    _rename(instr, renamings)
+    res.append(instr)
+    return res
+
+
+def _convert_if(instr, cur, live_after, versions, predicated):
+    # type: (if_instr, {str: Name}, {str}, _Versions, bool) -> [x86instruction]
+    _rename(instr, cur)
+    test = instr.vars[0]
+    then_cur = dict(cur)
+    else_cur = dict(cur)
+    then_ = _convert(instr.then_, then_cur, live_after, versions, predicated)
+    else_ = _convert(instr.else_, else_cur, live_after, versions, predicated)
+    phis = [(name, then_cur.get(name, Name(name)), else_cur.get(name, Name(name)))
+            for name in sorted(live_after)
+            if then_cur.get(name) is not else_cur.get(name)]
+
+    if not instr.secret:
+        for name, then_version, else_version in phis:
+            new = versions.new(name)
+            then_.append(movl(then_version, new))
+            else_.append(movl(else_version, new))
+            cur[name] = new
+        instr.then_ = then_
+        instr.else_ = else_
+        return [instr]
+
+    res = then_ + else_
+    if isinstance(test, Const):
+        # known at compile time, the branches only run for constant time. The
+        # phi still gets a version of its own: inside a loop, the taken
+        # branch's version could otherwise become the loop version, written
+        # before the other branch reads it
+        for name, then_version, else_version in phis:
+            new = versions.new(name)
+            res.append(movl(then_version if test.value != 0 else else_version,
+                            new))
+            cur[name] = new
+    elif predicated:
+        res += _mask_selects(test, phis, cur, versions)
+    elif phis:
+        # one compare for all selects, movl leaves the flags alone
+        res.append(cmpl(Const(0), test))
+        for name, then_version, else_version in phis:
+            new = versions.new(name)
+            res.append(movl(else_version, "%ecx"))
+            res.append(cmovne(then_version, "%ecx"))
+            res.append(movl("%ecx", new))
+            cur[name] = new
+    return res
+
+
+def _mask_selects(test, phis, cur, versions):
+    # type: (Name, [(str, Name, Name)], {str: Name}, _Versions) -> [x86instruction]
+    """
+    Selects with and/or over 0/-1 masks, so no flags are consumed:
+    x = (then & mask) | (else & ~mask).
+    """
+    res = []
+    if not phis:
+        return res
+    # normalize the test to 0/1, then 1 -> -1, 0 -> 0 and 1 -> 0, 0 -> -1
+    normalized = versions.new("test")
+    mask = versions.new("mask")
+    inv_mask = versions.new("inv_mask")
+    res.append(cmpl(Const(0), test))
+    res.append(setne_cl())
+    res.append(movzbl_cl(normalized))
+    res.append(movl(normalized, mask))
+    res.append(negl(mask))
+    res.append(movl(normalized, inv_mask))
+    res.append(addl(Const(-1), inv_mask))
+    for name, then_version, else_version in phis:
+        pick = versions.new("pick")
+        new = versions.new(name)
+        res.append(movl(then_version, pick))
+        res.append(andl(mask, pick))
+        res.append(movl(else_version, new))
+        res.append(andl(inv_mask, new))
+        res.append(orl(pick, new))
+        cur[name] = new
+    return res
+
+
+def _convert_while(instr, cur, live_after, versions, predicated):
+    # type: (while_instr, {str: Name}, {str}, _Versions, bool) -> [x86instruction]
+    head = live_at_loop_head(instr, live_after)
+    after_test = set(live_after) | set(instr.vars_names()) | \
+        live_before(instr.body, head)
+    written = set()
+    for i in instr.test_instrs + instr.body:
+        written |= set(_all_written(i))
+    # names carried around the loop get a version the test and body start
+    # with, and which is written before the loop and at the end of the body
+    carried = sorted(written & head)
+    res = []
+    for name in carried:
+        new = versions.new(name)
+        res.append(movl(cur.get(name, Name(name)), new))
+        cur[name] = new
+    loop_versions = dict((name, cur[name]) for name in carried)
+
+    instr.test_instrs = _convert(instr.test_instrs, cur, after_test, versions,
+                                 predicated)
+    _rename(instr, cur)
+    body_cur = dict(cur)
+    instr.body = _convert(instr.body, body_cur, head, versions, predicated)
+    last_versions = dict()
+    for name in carried:
+        if body_cur[name] is loop_versions[name]:
+            continue
+        elif body_cur[name] is cur[name] or _read_after_write(
+                instr.body, body_cur[name].name, loop_versions[name].name)[0]:
+            # last written by the test, or the loop version is still read
+            # after the last version is written (e.g. by the selects of a
+            # secret if testing it, or by its other branch)
+            instr.body.append(movl(body_cur[name], loop_versions[name]))
+        else:
+            # nothing reads the loop version once the body wrote the last
+            # version, so that can just as well be the loop version
+            last_versions[body_cur[name].name] = loop_versions[name]
+    _rename_all(instr.body, last_versions)
+    res.append(instr)
+    return res
+
+
+def _read_after_write(instrs, version, name, written=False):
+    # type: ([x86instruction], str, str, bool) -> (bool, bool)
+    """
+    Whether name may be read after version is written in instrs, and whether
+    version has been written at the end of them. Branches are taken to run
+    one after the other, as secret ones do.
+    """
+    for instr in instrs:
+        if isinstance(instr, if_instr):
+            if written and name in instr.vars_read():
+                return True, written
+            for branch in (instr.then_, instr.else_):
+                found, written = _read_after_write(branch, version, name, written)
+                if found:
+                    return True, written
+        elif isinstance(instr, while_instr):
+            # twice, for reads in one iteration after a write in the last
+            for _ in range(2):
+                found, written = _read_after_write(instr.test_instrs, version,
+                                                   name, written)
+                if found or (written and name in instr.vars_names()):
+                    return True, written
+                found, written = _read_after_write(instr.body, version, name,
+                                                   written)
+                if found:
+                    return True, written
+        else:
+            read = instr.vars_read()
+            if isinstance(instr, _READS_TARGET):
+                read = read + instr.vars_written()
+            if written and name in read:
+                return True, written
+            if version in instr.vars_written():
+                written = True
+    return False, written
+
+
+def _rename_all(instrs, renamings):
+    # type: ([x86instruction], {str: Name}) -> ()
+    if not renamings:
+        return
+    for instr in instrs:
+        _rename(instr, renamings)
+        if isinstance(instr, if_instr):
+            _rename_all(instr.then_, renamings)
+            _rename_all(instr.else_, renamings)
+        elif isinstance(instr, while_instr):
+            _rename_all(instr.test_instrs, renamings)
+            _rename_all(instr.body, renamings)
+
+
+def _all_written(instr):
+    # type: (x86instruction) -> [str]
+    if isinstance(instr, if_instr):
+        return sum(map(_all_written, instr.then_ + instr.else_), [])
+    elif isinstance(instr, while_instr):
+        return sum(map(_all_written, instr.test_instrs + instr.body), [])
+    return [v for v in instr.vars_written() if v[0] != "%"]
@@ -0,0 +1,126 @@
+from explicate_ast import *
+
+
+# Builders whose first argument is the length of the list they return.
+LIST_BUILDERS = {
+    "create_list_from",
+}
+
+# Subscript calls with a container and an index as their first two args, and
+# the runtime entries taking an in bounds, non-negative int index instead.
+_SPECIALIZED = {
+    "get_subscript": "list_get_int",
+    "set_subscript": "list_set_int",
+}
+
+
+def specialize_subscripts(flat_ast):
+    # type: (Module) -> Module
+    """
+    Rewrites `get_subscript`/`set_subscript` calls on a list of known length
+    with a constant, in bounds index into `list_get_int`/`list_set_int`, which
+    skip the tag dispatch and bounds checks of the generic calls.
+
+    Types are inferred over the flattened program for names that are
+    assigned exactly once: a list of length n from a `LIST_BUILDERS` call, an
+    int from a (negated) constant, or whatever the name it is copied from holds.
+    A single assignment holds in every scope the name is read in, and lists
+    never change length (programs have no append or `del`).
+    """
+    defs = dict()
+    _collect_defs(flat_ast.node.nodes, defs)
+    types = _infer(defs)
+    _rewrite(flat_ast.node.nodes, types)
+    return flat_ast
+
+
+def _collect_defs(stmts, defs):
+    # type: ([Node], {str: [Node]}) -> ()
+    for stmt in stmts:
+        if isinstance(stmt, Assign):
+            for node in stmt.nodes:
+                defs.setdefault(node.name, []).append(stmt.expr)
+        elif isinstance(stmt, IfStmt):
+            _collect_defs(stmt.then_.nodes, defs)
+            _collect_defs(stmt.else_.nodes, defs)
+        elif isinstance(stmt, WhileStmt):
+            _collect_defs(stmt.test_stmt.nodes, defs)
+            _collect_defs(stmt.body.nodes, defs)
+
+
+def _infer(defs):
+    # type: ({str: [Node]}) -> {str: (str, int)}
+    """
+    Maps names to ("list", length) or ("int", value).
+    """
+    types = dict()
+    changed = True
+    while changed:
+        changed = False
+        for name, exprs in defs.items():
+            if name in types or len(exprs) != 1:
+                continue
+            type = _type_of(exprs[0], types)
+            if type is not None:
+                types[name] = type
+                changed = True
+    return types
+
+
+def _type_of(expr, types):
+    # type: (Node, {str: (str, int)}) -> Optional[(str, int)]
+    if isinstance(expr, Const) and isinstance(expr.value, int):
+        return ("int", expr.value)
+    elif isinstance(expr, Name):
+        return types.get(expr.name)
+    elif isinstance(expr, UnarySub):
+        # negative literals parse as a negated constant
+        type = _type_of(expr.expr, types)
+        if type is not None and type[0] == "int":
+            return ("int", -type[1])
+    elif isinstance(expr, CallFunc) and isinstance(expr.node, Name) and \
+            expr.node.name in LIST_BUILDERS and isinstance(expr.args[0], Const):
+        return ("list", expr.args[0].value)
+    return None
+
+
+def _index(expr, types):
+    # type: (Node, {str: (str, int)}) -> Optional[int]
+    type = _type_of(expr, types)
+    if type is not None and type[0] == "int":
+        return type[1]
+    return None
+
+
+def _specialize(expr, types):
+    # type: (Node, {str: (str, int)}) -> Node
+    if not isinstance(expr, CallFunc) or not isinstance(expr.node, Name) or \
+            expr.node.name not in _SPECIALIZED:
+        return expr
+    container, index = expr.args[0], expr.args[1]
+    type = _type_of(container, types)
+    i = _index(index, types)
+    if type is None or type[0] != "list" or i is None:
+        return expr
+    length = type[1]
+    if i < 0:
+        # python counts negative indices from the end
+        i += length
+    if not 0 <= i < length:
+        # leave the error to the runtime
+        return expr
+    return CallFunc(Name(_SPECIALIZED[expr.node.name]),
+                    [container, Const(i)] + expr.args[2:])
+
+
+def _rewrite(stmts, types):
+    # type: ([Node], {str: (str, int)}) -> ()
+    for stmt in stmts:
+        if isinstance(stmt, Assign) or isinstance(stmt, Discard):
+            stmt.expr = _specialize(stmt.expr, types)
+        elif isinstance(stmt, IfStmt):
+            _rewrite(stmt.then_.nodes, types)
+            _rewrite(stmt.else_.nodes, types)
+        elif isinstance(stmt, WhileStmt):
+            _rewrite(stmt.test_stmt.nodes, types)
+            _rewrite(stmt.body.nodes, types)
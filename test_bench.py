@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 from compile import _ProgramCompiler
+import compile
 import subprocess
 import os
 from shutil import rmtree as rm
 import traceback
+import sys
 
 from libs.termcolor import colored
 
@@ -102,6 +104,21 @@ class TestCompiler(object):
 			pass
 			#rm(self.build_dir, ignore_errors=True)
 
+def unroll_curve(filename="./benchmarks/while.py", iterations=1000000, factors=(1, 2, 4, 8), runs=10):
+	# prints the mean time per loop iteration for each unroll factor
+	for k in factors:
+		compile.UNROLL = k
+		test = TestCompiler(input_filename=filename, test_name="unroll %d" % k)
+		test._compile_python()
+		test._compile_assembly()
+		times = []
+		for _ in range(runs):
+			test._run_binary()
+			times.append(int(test.binary_out.split("nanoseconds: ")[1].split()[0]))
+		print "unroll %d: %.2f ns/iteration" % (k, float(sum(times)) / runs / iterations)
+	compile.UNROLL = 1
+
+
 def main():
 	test_dir = "./benchmarks/"
 	for test_filename in sorted(os.listdir(test_dir)):
@@ -125,4 +142,7 @@ def main():
 
 
 if __name__ == "__main__":
-	main()
+	if sys.argv[1:] == ["unroll"]:
+		unroll_curve()
+	else:
+		main()
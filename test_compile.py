@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-from compile import _ProgramCompiler
+from compile import _ProgramCompiler, parse_args, configure
 import subprocess
 import os
 from shutil import rmtree as rm
@@ -7,10 +7,26 @@ import traceback
 
 from libs.termcolor import colored
 
+# Every test runs under each of these, the compiler's modes
+FLAG_COMBINATIONS = [
+	[],
+	["-c"],
+	["-p"],
+	["-c", "-s"],
+	["-c", "-u", "2"],
+	["-c", "--ssa"],
+	["-p", "--ssa"],
+]
+
+# secret-*.py tests only have ifs on secrets, which -c -s has to protect
+# however the secret got there. A leak doesn't change what is printed, so
+# their assembly is checked for plain jumps instead, on each of these.
+SECRET_BRANCH_ARCHS = ["i386", "x86_64"]
+
 
 class TestCompiler(object):
-	def __init__(self, input_code=None, input_filename=None, subprocess_stdin=None, test_name=None, build_dir="./tests/target"):
-		# type: (str, str, list) -> None
+	def __init__(self, input_code=None, input_filename=None, subprocess_stdin=None, test_name=None, build_dir="./tests/target", flags=()):
+		# type: (str, str, list, str, str, list) -> None
 		# if input_filename is provided, input_code is ignored
 
 		rm(build_dir, ignore_errors=True)
@@ -34,11 +50,17 @@ class TestCompiler(object):
 		else:
 			self.test_name = ""
 
+		# compiler command line flags
+		self.flags = list(flags)
+		if self.flags:
+			self.test_name += " " + " ".join(self.flags)
+
 		self.assembly_filename = build_dir + "/.tmp_test.s"
 		self.binary_filename = build_dir + "/.tmp_test"
 
 	def _compile_python(self):
 		assembly_file = open(self.assembly_filename, 'wb')
+		configure(parse_args(self.flags + [self.source_filename]))
 		_ProgramCompiler(input_filename=self.source_filename).compile_to_file(assembly_file)
 
 	def _compile_assembly(self):
@@ -141,6 +163,58 @@ class TestCompiler(object):
 			rm(self.build_dir, ignore_errors=True)
 
 
+class RuntimeTest(TestCompiler):
+	"""
+	Runs a C program against the runtime and checks its output against the
+	`.out` file next to it, for runtime paths compiled programs don't reach.
+	"""
+	def __init__(self, source_filename, expected_out, test_name=None, build_dir="./tests/target"):
+		super(RuntimeTest, self).__init__(input_filename=source_filename, test_name=test_name,
+										  build_dir=build_dir)
+		self.expected_out = expected_out
+
+	def _compile_python(self):
+		pass
+
+	def _compile_assembly(self):
+		gcc_proc = subprocess.Popen(['gcc', '-m32', '-g', '-Iruntime', self.source_filename,
+									 'runtime/libpyyruntime.a', '-lm', '-o', self.binary_filename],
+									stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		build_out, build_err = gcc_proc.communicate()
+
+		if gcc_proc.returncode != 0:
+			raise Exception("Compilation failed!\n" + build_out + "\n" + build_err)
+
+	def _run_reference(self):
+		self.reference_out = self.expected_out
+		self.reference_ret = 0
+
+
+class SecretBranchTest(object):
+	"""
+	Compiles a program whose ifs all depend on a secret with -c -s, and
+	checks none of them was left a plain `je`.
+	"""
+	def __init__(self, source_filename, arch, test_name=None):
+		self.source_filename = source_filename
+		self.arch = arch
+		self.test_name = (test_name or source_filename) + " -c -s --arch=" + arch
+
+	def Run(self):
+		asm = ""
+		try:
+			configure(parse_args(["-c", "-s", "--arch=" + self.arch, self.source_filename]))
+			asm = _ProgramCompiler(input_filename=self.source_filename).compile()
+			leaks = [line for line in asm.splitlines() if line.startswith("je elselabel_")]
+			if leaks or "cmov" not in asm:
+				raise RuntimeWarning("Secret if compiled to a jump: " + ", ".join(leaks))
+			print colored(">> TEST SUCCESS ", "green") + self.test_name
+		except Exception as e:
+			print colored(">> TEST FAILED ", "red"), self.test_name
+			print e
+			print "> Assembly was:"
+			print asm
+
 
 def main():
 	test_dir = "./tests/"
@@ -160,7 +234,16 @@ def main():
 			except IOError:
 				pass
 
-			TestCompiler(input_code=input_code, subprocess_stdin=subprocess_stdin, test_name=test_filename).Run()
+			for flags in FLAG_COMBINATIONS:
+				TestCompiler(input_code=input_code, subprocess_stdin=subprocess_stdin, test_name=test_filename,
+							 flags=flags).Run()
+			if test_filename.startswith("secret-"):
+				for arch in SECRET_BRANCH_ARCHS:
+					SecretBranchTest(test_dir + test_filename, arch, test_name=test_filename).Run()
+		elif test_filename.endswith(".c"):
+			with open(test_dir + test_filename[:-2] + ".out", 'r') as expected_file:
+				expected_out = expected_file.read()
+			RuntimeTest(test_dir + test_filename, expected_out, test_name=test_filename).Run()
 	return
 	# still could run tests like this:
 	TestCompiler(input_code="xw=-input()\nyw=-input()\nprint yw+2+0+3+2+xw",
@@ -0,0 +1,17 @@
+n = input()
+k = input()
+i = 0
+s = 0
+p = 1
+while i != n:
+    if i == k:
+        s = s + 10
+        if p:
+            p = 0
+        else:
+            s = s + 100
+    else:
+        s = s + i
+    i = i + 1
+print s
+print p
@@ -0,0 +1,18 @@
+n = input()
+a = 1
+b = 0
+c = 0
+while n:
+    if a:
+        b = b + n
+        a = 0
+    else:
+        c = c + b
+        a = 1
+    t = b
+    b = c
+    c = t
+    n = n + -1
+print a
+print b
+print c
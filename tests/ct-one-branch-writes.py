@@ -0,0 +1,21 @@
+a = input()
+b = input()
+x = 5
+y = 7
+z = a + b
+if a:
+    x = x + b
+else:
+    y = z + y
+print x
+print y
+if b:
+    z = 2
+else:
+    y = z + 1
+print y
+if a + -1:
+    w = 3
+else:
+    w = 4
+print w
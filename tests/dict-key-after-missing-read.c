@@ -0,0 +1,26 @@
+/* Reading a missing key of a dict that is a key of another dict leaves it
+   alone: an equal dict then finds the same entry, and compares equal. */
+#include "runtime.h"
+
+static pyobj dict_of(int key, int val)
+{
+  pyobj d = inject_big(create_dict());
+  set_subscript(d, inject_int(key), inject_int(val));
+  return d;
+}
+
+int main()
+{
+  pyobj a = dict_of(1, 2);
+  pyobj outer = inject_big(create_dict());
+  pyobj b;
+
+  set_subscript(outer, a, inject_int(7));
+  print_any(get_subscript(a, inject_int(5)));
+  b = dict_of(1, 2);
+  set_subscript(outer, b, inject_int(8));
+  print_any(a);
+  print_any(outer);
+  print_any(inject_bool(equal(project_big(a), project_big(b))));
+  return 0;
+}
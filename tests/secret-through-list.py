@@ -0,0 +1,9 @@
+s = input()
+l = [0, 0]
+l[1] = s
+y = l[1]
+if y:
+    z = 1
+else:
+    z = 2
+print z
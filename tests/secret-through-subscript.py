@@ -0,0 +1,12 @@
+s = input()
+l = [0, 0]
+i = 0
+while i != 2:
+    l[i] = s
+    i = i + 1
+y = l[0]
+if y:
+    z = 1
+else:
+    z = 2
+print z
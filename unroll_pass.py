@@ -0,0 +1,63 @@
+from instructions import *
+from compiler.ast import Const
+import copy
+
+
+# Instructions that can run on the not-taken side of a constant time branch,
+# since their effects are undone by the cmov merges.
+_PREDICABLE_INSTRS = {movl, addl, leal, negl, sall, sarl, andl, orl, cmpl,
+                      sete_cl, setne_cl, movzbl_cl, cmove, cmovne}
+
+
+def unroll_loops(x86IR, k):
+    # type: ([x86instruction], int) -> [x86instruction]
+    """
+    Unrolls secret while loops k times, so the zigzag trampolines of the loop
+    are only paid once per k iterations:
+
+    while test:           while test:
+        body                  body
+                              test_instrs
+                              if test: body    (k - 1 times)
+
+    The copies are guarded by an `if_instr` on the re-evaluated test, which
+    `if_to_cmov` turns into merges. Once the test fails it stays false for
+    the rest of the copies, as the guarded bodies don't change anything.
+    Only loops that can run on both sides of a branch (no calls or nested
+    loops) are unrolled.
+    """
+    for instr in x86IR:
+        if isinstance(instr, if_instr):
+            unroll_loops(instr.then_, k)
+            unroll_loops(instr.else_, k)
+        elif isinstance(instr, while_instr):
+            unroll_loops(instr.body, k)
+            if k > 1 and instr.secret and _is_unrollable(instr):
+                _unroll(instr, k)
+    return x86IR
+
+
+def _is_predicable(instrs):
+    # type: ([x86instruction]) -> bool
+    for instr in instrs:
+        if isinstance(instr, if_instr):
+            if not _is_predicable(instr.then_ + instr.else_):
+                return False
+        elif type(instr) not in _PREDICABLE_INSTRS:
+            return False
+    return True
+
+
+def _is_unrollable(loop):
+    # type: (while_instr) -> bool
+    # a constant test never changes, so there is nothing to guard with
+    return not isinstance(loop.vars[0], Const) and \
+        _is_predicable(loop.test_instrs + loop.body)
+
+
+def _unroll(loop, k):
+    # type: (while_instr, int) -> ()
+    body = loop.body
+    for _ in range(k - 1):
+        guarded = if_instr(loop.vars[0], copy.deepcopy(body), [])
+        loop.body = loop.body + copy.deepcopy(loop.test_instrs) + [guarded]